@@ -3,7 +3,15 @@ from app import create_app
 
 # 根据环境变量自动选择配置
 config_name = os.environ.get('FLASK_ENV', 'development')
-app = create_app(config_name)
+config_overrides = None
+if __name__ == '__main__':
+    # 直接运行开发服务器时在后台构建产品搜索索引，
+    # 并在进程内投递订单通知，不需要另外运行 scripts/notification_worker.py
+    config_overrides = {
+        'SEARCH_INDEX_WARM_UP': os.environ.get('SEARCH_INDEX_WARM_UP', 'true').lower() in ['true', 'on', '1'],
+        'NOTIFICATION_WORKER_THREAD': os.environ.get('NOTIFICATION_WORKER_THREAD', 'true').lower() in ['true', 'on', '1']
+    }
+app = create_app(config_name, config_overrides)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=config_name == 'development')
@@ -10,12 +10,19 @@ login_manager = LoginManager()
 mail = Mail()
 migrate = Migrate()
 
-def create_app(config_name='default'):
+def create_app(config_name='default', config_overrides=None):
+    """
+    创建应用
+    :param config_name: 配置名称，见 config.config
+    :param config_overrides: 覆盖的配置项（如测试脚本指定独立的 SQLALCHEMY_DATABASE_URI）
+    """
     app = Flask(__name__)
     
     # 加载配置
     from config import config
     app.config.from_object(config[config_name])
+    if config_overrides:
+        app.config.update(config_overrides)
     
     # 确保上传目录存在（处理只读文件系统）
     try:
@@ -83,4 +90,14 @@ def create_app(config_name='default'):
         from app.services.init_service import init_sample_data
         init_sample_data()
     
+    # 后台构建产品搜索索引
+    if app.config.get('SEARCH_INDEX_WARM_UP'):
+        from app.services.search_service import SearchService
+        SearchService.warm_up(app)
+    
+    # 启动通知发件箱投递线程
+    if app.config.get('NOTIFICATION_WORKER_THREAD'):
+        from app.services.outbox_service import OutboxService
+        OutboxService.start_worker_thread(app, interval=app.config['NOTIFICATION_WORKER_INTERVAL'])
+    
     return app
@@ -70,10 +70,47 @@ class Product(db.Model):
     # 关系
     images = db.relationship('ProductImage', backref='product', lazy='dynamic', cascade='all, delete-orphan')
     order_items = db.relationship('OrderItem', backref='product', lazy='dynamic')
+    search_key = db.relationship('ProductSearchKey', backref='product', uselist=False, cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Product {self.product_code} - {self.name}>'
 
+class ProductSearchKey(db.Model):
+    """产品名称的拼音检索键，保存产品时预先计算"""
+    __tablename__ = 'product_search_keys'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    name_pinyin = db.Column(db.String(500), index=True)  # 全拼，如 maojin
+    name_initials = db.Column(db.String(200), index=True)  # 首字母，如 mj
+    
+    def __repr__(self):
+        return f'<ProductSearchKey {self.product_id} {self.name_initials}>'
+
+class CatalogVersion(db.Model):
+    """产品目录版本号，产品、图片的任何写入都会递增，供各进程判断缓存是否失效
+    id=1 为目录版本号，id=2 为库存版本号（下单、取消订单后递增，见 CatalogService）
+    """
+    __tablename__ = 'catalog_versions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CatalogVersion {self.version}>'
+
+class ProductTombstone(db.Model):
+    """已删除产品的记录，供离线终端增量同步时删除本地数据"""
+    __tablename__ = 'product_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    product_code = db.Column(db.String(50))
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<ProductTombstone {self.product_id}>'
+
 class ProductImage(db.Model):
     __tablename__ = 'product_images'
     
@@ -89,6 +126,12 @@ class ProductImage(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        # 订单列表按 (created_at, id) 倒序做游标分页
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
+    
+    archived = False  # 已归档的订单见 ArchivedOrder
     
     id = db.Column(db.Integer, primary_key=True)
     order_no = db.Column(db.String(50), unique=True, nullable=False, index=True)  # 订单号
@@ -109,15 +152,69 @@ class Order(db.Model):
     
     # 关系
     items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
+    notifications = db.relationship('NotificationOutbox', backref='order', lazy='dynamic', cascade='all, delete-orphan')
+    idempotency_keys = db.relationship('OrderIdempotencyKey', backref='order', lazy='dynamic', cascade='all, delete-orphan')
+    search_terms = db.relationship('OrderSearchTerm', backref='order', lazy='dynamic', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Order {self.order_no}>'
 
+class NotificationOutbox(db.Model):
+    """待发送的订单通知，与订单在同一事务中写入，由后台任务投递"""
+    __tablename__ = 'notification_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
+    channel = db.Column(db.String(20), nullable=False)  # email, sms
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, sent, skipped, failed
+    attempts = db.Column(db.Integer, default=0)  # 已尝试次数
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # 下次可投递时间
+    locked_until = db.Column(db.DateTime)  # 被投递任务认领的截止时间
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<NotificationOutbox {self.order_id} {self.channel} {self.status}>'
+
+class OrderIdempotencyKey(db.Model):
+    """下单请求的幂等键（客户端 Idempotency-Key），重复提交时直接返回首次的响应"""
+    __tablename__ = 'order_idempotency_keys'
+    
+    key = db.Column(db.String(100), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)  # 请求内容摘要，同一个键不能用于不同的请求
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    response = db.Column(db.Text)  # 首次请求返回的 JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OrderIdempotencyKey {self.key}>'
+
+class OrderSearchTerm(db.Model):
+    """订单检索词（订单号后缀、电话后几位、客户姓名 n-gram），按 (term, order_id) 主键范围查找"""
+    __tablename__ = 'order_search_terms'
+    
+    term = db.Column(db.String(64), primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), primary_key=True, index=True)
+    
+    def __repr__(self):
+        return f'<OrderSearchTerm {self.term} {self.order_id}>'
+
+class OrderSequence(db.Model):
+    """订单号序列（每天一行），各进程从这里按块申请序号"""
+    __tablename__ = 'order_sequences'
+    
+    day = db.Column(db.String(8), primary_key=True)  # 日期 yyyymmdd
+    last_value = db.Column(db.Integer, nullable=False, default=0)  # 已分配出去的最大序号
+    
+    def __repr__(self):
+        return f'<OrderSequence {self.day} {self.last_value}>'
+
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     product_name = db.Column(db.String(200))
     product_code = db.Column(db.String(50))
@@ -128,6 +225,58 @@ class OrderItem(db.Model):
     def __repr__(self):
         return f'<OrderItem {self.id}>'
 
+class ArchivedOrder(db.Model):
+    """已归档的订单（超过热数据保留期，由 scripts/archive_orders.py 从 orders 迁入，只读）
+    PostgreSQL 上按 created_at 按月分区（分区由归档任务创建），SQLite 上为普通表。
+    分区表的主键必须包含分区键，所以主键为 (id, created_at)，id 沿用原订单 id。
+    """
+    __tablename__ = 'orders_archive'
+    __table_args__ = (
+        db.Index('ix_orders_archive_created_at_id', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+    
+    archived = True
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    created_at = db.Column(db.DateTime, primary_key=True)
+    order_no = db.Column(db.String(50), nullable=False, index=True)
+    customer_name = db.Column(db.String(100), nullable=False)
+    customer_phone = db.Column(db.String(20))
+    customer_email = db.Column(db.String(120))
+    customer_address = db.Column(db.Text)
+    total_amount = db.Column(db.Float, default=0)
+    total_quantity = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20))
+    notes = db.Column(db.Text)
+    notified = db.Column(db.Boolean, default=False)
+    updated_at = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ArchivedOrder {self.order_no}>'
+
+class ArchivedOrderItem(db.Model):
+    """已归档订单的明细，按所属订单的下单时间（order_created_at）与订单同样分区"""
+    __tablename__ = 'order_items_archive'
+    __table_args__ = (
+        {'postgresql_partition_by': 'RANGE (order_created_at)'},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_created_at = db.Column(db.DateTime, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    product_name = db.Column(db.String(200))
+    product_code = db.Column(db.String(50))
+    quantity = db.Column(db.Integer, default=1)
+    unit_price = db.Column(db.Float, default=0)
+    subtotal = db.Column(db.Float, default=0)
+    
+    def __repr__(self):
+        return f'<ArchivedOrderItem {self.id}>'
+
 class SystemSetting(db.Model):
     __tablename__ = 'system_settings'
     
@@ -1,8 +1,13 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, send_file, abort
 from flask_login import login_required, current_user
-from app.models import db, Product, ProductImage, Category, Order, OrderItem, SystemSetting
+from app.models import db, Product, ProductImage, Category, Order, OrderItem, ArchivedOrder, SystemSetting
 from app.services.product_service import ProductService
+from app.services.search_service import SearchService
 from app.services.order_service import OrderService
+from app.services.order_search_service import OrderSearchService
+from app.services.order_serialization_service import OrderSerializationService
+from app.services.catalog_service import CatalogService
+from app.services.archive_service import ArchiveService
 from app.services.statistics_service import StatisticsService
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
@@ -44,31 +49,23 @@ def products():
     # 搜索条件
     query = request.args.get('q', '')
     category_id = request.args.get('category_id', type=int)
+    sort = 'relevance' if request.args.get('sort') == 'relevance' else 'newest'
     
-    products_query = Product.query
-    
-    if query:
-        products_query = products_query.filter(
-            (Product.name.contains(query)) |
-            (Product.product_code.contains(query)) |
-            (Product.barcode.contains(query))
-        )
-    
-    if category_id:
-        products_query = products_query.filter_by(category_id=category_id)
-    
-    pagination = products_query.order_by(Product.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 后台列表不限产品状态
+    pagination = SearchService.paginate(query, category_id=category_id, status=None,
+                                        page=page, per_page=per_page, sort=sort)
     
     categories = Category.query.all()
+    primary_images = ProductService.get_primary_image_map([product.id for product in pagination.items])
     
     return render_template('admin/products.html',
                          products=pagination.items,
+                         primary_images=primary_images,
                          pagination=pagination,
                          categories=categories,
                          query=query,
-                         category_id=category_id)
+                         category_id=category_id,
+                         sort=sort)
 
 @admin_bp.route('/products/new', methods=['GET', 'POST'])
 @login_required
@@ -94,6 +91,8 @@ def product_new():
 
             product = ProductService.create_product(data)
 
+            added_images = 0
+            
             # 处理图片上传
             if 'images' in request.files:
                 files = request.files.getlist('images')
@@ -109,6 +108,7 @@ def product_new():
                                 sort_order=idx
                             )
                             db.session.add(image)
+                            added_images += 1
 
             # 处理网络图片
             image_urls = request.form.get('image_urls', '').strip()
@@ -126,8 +126,14 @@ def product_new():
                             sort_order=existing_count + idx
                         )
                         db.session.add(image)
+                        added_images += 1
 
-            db.session.commit()
+            # 图片变化不会改动产品行，有新图片时更新修改时间使按 updated_at 缓存的数据失效
+            # （产品本身的保存已递增过目录版本号）
+            if added_images:
+                ProductService.touch_products([product.id])
+                CatalogService.bump_version()
+                db.session.commit()
 
             # 判断是否是AJAX请求
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -174,6 +180,8 @@ def product_edit(product_id):
 
             ProductService.update_product(product_id, data)
 
+            added_images = 0
+            
             # 处理新图片上传
             if 'images' in request.files:
                 files = request.files.getlist('images')
@@ -189,6 +197,7 @@ def product_edit(product_id):
                                 sort_order=existing_count + idx
                             )
                             db.session.add(image)
+                            added_images += 1
 
             # 处理网络图片
             image_urls = request.form.get('image_urls', '').strip()
@@ -205,8 +214,14 @@ def product_edit(product_id):
                             sort_order=existing_count + idx
                         )
                         db.session.add(image)
+                        added_images += 1
 
-            db.session.commit()
+            # 图片变化不会改动产品行，有新图片时更新修改时间使按 updated_at 缓存的数据失效
+            # （产品本身的保存已递增过目录版本号）
+            if added_images:
+                ProductService.touch_products([product.id])
+                CatalogService.bump_version()
+                db.session.commit()
 
             # 判断是否是AJAX请求
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -300,7 +315,7 @@ def download_sample():
 @login_required
 def orders():
     """订单列表"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor') or None
     per_page = 20
     
     # 筛选条件
@@ -308,24 +323,29 @@ def orders():
     query_text = request.args.get('q', '')
     
     orders_query = Order.query
+    archive_query = ArchivedOrder.query
     
     if status:
         orders_query = orders_query.filter_by(status=status)
+        archive_query = archive_query.filter_by(status=status)
     
     if query_text:
-        orders_query = orders_query.filter(
-            (Order.order_no.contains(query_text)) |
-            (Order.customer_name.contains(query_text)) |
-            (Order.customer_phone.contains(query_text))
-        )
+        # 订单号前缀/后缀、电话后几位、客户姓名，走订单检索词索引
+        orders_query = OrderSearchService.filter_orders(orders_query, query_text)
+        # 归档订单没有检索词，翻到归档数据时才逐行匹配
+        archive_query = OrderSearchService.like_filter(ArchivedOrder, archive_query, query_text)
     
-    pagination = orders_query.order_by(Order.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 按 (created_at, id) 游标分页，翻页不做 OFFSET 扫描和 COUNT；翻过热数据后继续列出归档订单
+    try:
+        pagination = ArchiveService.paginate_orders(orders_query, archive_query, cursor=cursor, per_page=per_page)
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('admin.orders', status=status, q=query_text))
     
     return render_template('admin/orders.html',
                          orders=pagination.items,
                          pagination=pagination,
+                         cursor=cursor,
                          status=status,
                          query=query_text)
 
@@ -333,8 +353,10 @@ def orders():
 @login_required
 def order_detail(order_id):
     """订单详情"""
-    order = Order.query.get_or_404(order_id)
-    return render_template('admin/order_detail.html', order=order)
+    order, items = OrderSerializationService.load(order_id=order_id)
+    if order is None:
+        abort(404)
+    return render_template('admin/order_detail.html', order=order, items=items)
 
 @admin_bp.route('/orders/<int:order_id>/status', methods=['POST'])
 @login_required
@@ -350,13 +372,69 @@ def order_update_status(order_id):
     
     return redirect(url_for('admin.order_detail', order_id=order_id))
 
+# 批量更新订单状态每次最多的订单数
+MAX_BULK_STATUS_ORDERS = 1000
+
+ORDER_STATUS_LABELS = {
+    'pending': '待处理',
+    'confirmed': '已确认',
+    'shipped': '已发货',
+    'completed': '已完成',
+    'cancelled': '已取消'
+}
+
+@admin_bp.route('/orders/status', methods=['POST'])
+@login_required
+def orders_bulk_update_status():
+    """
+    批量更新订单状态
+    表单提交 order_ids（多个）和 status，完成后返回订单列表；
+    JSON 提交 {"order_ids": [...], "status": "..."} 时返回 {"success", "updated", "skipped"}
+    """
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        raw_ids = data.get('order_ids') or []
+        status = data.get('status')
+    else:
+        raw_ids = request.form.getlist('order_ids')
+        status = request.form.get('status')
+    
+    try:
+        try:
+            order_ids = list(dict.fromkeys(int(order_id) for order_id in raw_ids))
+        except (TypeError, ValueError):
+            raise ValueError('订单ID格式不正确')
+        if not order_ids:
+            raise ValueError('请选择订单')
+        if len(order_ids) > MAX_BULK_STATUS_ORDERS:
+            raise ValueError(f'每次最多更新 {MAX_BULK_STATUS_ORDERS} 个订单')
+        updated = OrderService.bulk_update_status(order_ids, status)
+    except ValueError as e:
+        if request.is_json:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        flash(f'更新失败: {str(e)}', 'error')
+    else:
+        skipped = len(order_ids) - updated
+        if request.is_json:
+            return jsonify({'success': True, 'updated': updated, 'skipped': skipped})
+        message = f'已将 {updated} 个订单更新为{ORDER_STATUS_LABELS[status]}'
+        if skipped:
+            message += f'，{skipped} 个订单的当前状态不能变更为{ORDER_STATUS_LABELS[status]}'
+        flash(message, 'success' if updated else 'warning')
+    
+    # 回到提交前的列表页（保留筛选条件）
+    return redirect(url_for('admin.orders', status=request.form.get('filter_status') or None,
+                            q=request.form.get('q') or None, cursor=request.form.get('cursor') or None))
+
 # 分类管理
 @admin_bp.route('/categories')
 @login_required
 def categories():
     """分类列表"""
     categories = Category.query.order_by(Category.sort_order).all()
-    return render_template('admin/categories.html', categories=categories)
+    # 产品数量读取搜索索引维护的分类计数，不逐个分类执行 COUNT
+    product_counts = SearchService.category_counts()
+    return render_template('admin/categories.html', categories=categories, product_counts=product_counts)
 
 @admin_bp.route('/categories/new', methods=['POST'])
 @login_required
@@ -482,6 +560,8 @@ def delete_product_image(image_id):
 
         # 删除数据库记录
         db.session.delete(image)
+        ProductService.touch_products([product_id])
+        CatalogService.bump_version()
         db.session.commit()
 
         # 判断是否是AJAX请求
@@ -514,6 +594,8 @@ def set_primary_image(image_id):
 
         # 设置当前图片为主图
         image.is_primary = True
+        ProductService.touch_products([product_id])
+        CatalogService.bump_version()
         db.session.commit()
 
         # 判断是否是AJAX请求
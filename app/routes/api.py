@@ -1,12 +1,75 @@
-from flask import Blueprint, request, jsonify, current_app
-from app.models import db, Product, ProductImage, Order, OrderItem
+from flask import Blueprint, request, jsonify, current_app, Response, abort, stream_with_context
+from werkzeug.http import is_resource_modified
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Product
 from app.services.product_service import ProductService
-from app.services.order_service import OrderService
+from app.services.search_service import SearchService
+from app.services.catalog_service import CatalogService
+from app.services.cache_service import LRUCache
+from app.services.serialization_service import SerializationService, LIST_COLUMNS, dumps
+from app.services.export_service import ExportService
+from app.services.idempotency_service import IdempotencyService, MAX_KEY_LENGTH
+from app.services.order_service import OrderService, InsufficientStockError
+from app.services.order_serialization_service import OrderSerializationService
 from app.services.notification_service import NotificationService
 from datetime import datetime
+import hashlib
 
 api_bp = Blueprint('api', __name__)
 
+# 搜索支持的排序方式
+SEARCH_SORTS = ('newest', 'relevance')
+
+# 搜索结果缓存（按目录版本号和库存版本号整体失效）
+search_result_cache = LRUCache(maxsize=1000)
+
+# 搜索接口可返回的产品字段（对应数据库列）
+PRODUCT_FIELDS = LIST_COLUMNS
+# 需要额外查询图片表的字段
+IMAGE_FIELDS = ('primary_image', 'all_images')
+# 搜索接口每页最大数量
+MAX_PER_PAGE = 100
+
+
+def parse_product_fields(value):
+    """
+    解析 fields 参数（逗号分隔）
+    :return: 字段名元组（总是包含 id），未指定时返回全部字段
+    :raises ValueError: 包含不支持的字段
+    """
+    if not value:
+        return PRODUCT_FIELDS + IMAGE_FIELDS
+    fields = tuple(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in PRODUCT_FIELDS + IMAGE_FIELDS]
+    if unknown:
+        raise ValueError(f'不支持的字段: {", ".join(unknown)}')
+    return ('id',) + tuple(field for field in fields if field != 'id')
+
+
+def not_modified_response(etag, last_modified):
+    """
+    客户端缓存仍然有效（If-None-Match / If-Modified-Since 命中）时返回 304 响应，否则返回 None
+    """
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = Response(status=304)
+    set_cache_validators(response, etag, last_modified)
+    return response
+
+
+def json_response(body):
+    """返回已编码的 JSON 字符串"""
+    return Response(body, mimetype='application/json')
+
+
+def set_cache_validators(response, etag, last_modified):
+    """设置 ETag、Last-Modified，并要求客户端每次使用缓存前重新校验"""
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
 # 产品相关API
 @api_bp.route('/products/search', methods=['GET'])
 def api_search_products():
@@ -14,89 +77,375 @@ def api_search_products():
     query = request.args.get('q', '')
     category_id = request.args.get('category_id', type=int)
     page = request.args.get('page', 1, type=int)
-    per_page = 20
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE))
+    # 只返回 fields 指定的字段，数据库也只查询对应的列
+    try:
+        fields = parse_product_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    # 完整字段时直接拼接缓存的产品片段（需要 updated_at，加载整行）
+    full_fields = set(fields) == set(PRODUCT_FIELDS + IMAGE_FIELDS)
+    columns = None if full_fields else [field for field in fields if field in PRODUCT_FIELDS]
+    # 排序：newest 按创建时间倒序；relevance 按相关度（完全匹配 > 前缀 > 子串 > 容错）
+    sort = request.args.get('sort', 'newest')
+    if sort not in SEARCH_SORTS:
+        return jsonify({
+            'success': False,
+            'message': f'不支持的排序方式: {sort}'
+        }), 400
     
-    # 构建查询
-    products_query = Product.query.filter_by(status='active')
+    # 传入 cursor 参数（首页传空值）时使用游标分页，不做 OFFSET 扫描和 COUNT
+    use_cursor = 'cursor' in request.args
+    cursor = request.args.get('cursor') or None
+    with_total = request.args.get('with_total', 0, type=int) == 1
+    # facets=1 时同时返回各分类的命中数（与搜索在同一次索引扫描中统计）
+    facets = request.args.get('facets', 0, type=int) == 1
     
-    if query:
-        products_query = products_query.filter(
-            (Product.name.contains(query)) |
-            (Product.product_code.contains(query)) |
-            (Product.barcode.contains(query)) |
-            (Product.model.contains(query))
-        )
+    # 搜索结果只随目录版本号和库存版本号变化：ETag 由版本号和查询参数得出，客户端缓存有效时直接返回 304
+    catalog_version, catalog_updated_at = CatalogService.get_state()
+    cache_key = (query, category_id, page, per_page, sort, use_cursor, cursor, with_total, fields, facets)
+    etag = hashlib.md5(repr((catalog_version, cache_key)).encode('utf-8')).hexdigest()
+    response = not_modified_response(etag, catalog_updated_at)
+    if response is not None:
+        return response
     
-    if category_id:
-        products_query = products_query.filter_by(category_id=category_id)
+    # 命中缓存时直接返回（缓存的是编码好的响应）
+    body = search_result_cache.get(cache_key, catalog_version)
+    if body is not None:
+        return set_cache_validators(json_response(body), etag, catalog_updated_at)
     
-    # 分页
-    pagination = products_query.order_by(Product.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 搜索并分页（关键词走倒排索引）
+    if use_cursor:
+        try:
+            pagination = SearchService.cursor_paginate(
+                query, category_id=category_id, cursor=cursor,
+                per_page=per_page, with_total=with_total, sort=sort, columns=columns,
+                facets=facets
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+    else:
+        pagination = SearchService.paginate(query, category_id=category_id, page=page,
+                                            per_page=per_page, sort=sort, columns=columns,
+                                            facets=facets)
     
-    products_data = []
-    for product in pagination.items:
-        images = [img.image_url for img in product.images.order_by(ProductImage.sort_order)]
-        primary_image = images[0] if images else None
-        
-        products_data.append({
-            'id': product.id,
-            'product_code': product.product_code,
-            'barcode': product.barcode,
-            'name': product.name,
-            'model': product.model,
-            'specification': product.specification,
-            'unit': product.unit,
-            'retail_price': product.retail_price,
-            'wholesale_price': product.wholesale_price,
-            'wholesale_min_qty': product.wholesale_min_qty,
-            'stock': product.stock,
-            'description': product.description,
-            'primary_image': primary_image,
-            'all_images': images
+    if full_fields:
+        fragments = SerializationService.list_fragments(pagination.items)
+    else:
+        # 未请求图片字段时不查询图片表
+        with_images = any(field in IMAGE_FIELDS for field in fields)
+        images_map = {}
+        if with_images:
+            images_map = ProductService.get_image_urls_map([product.id for product in pagination.items])
+        fragments = []
+        for product in pagination.items:
+            product_data = {field: getattr(product, field) for field in columns}
+            if with_images:
+                images = images_map[product.id]
+                if 'primary_image' in fields:
+                    product_data['primary_image'] = images[0] if images else None
+                if 'all_images' in fields:
+                    product_data['all_images'] = images
+            fragments.append(dumps(product_data))
+    
+    if use_cursor:
+        result = {
+            'success': True,
+            'next_cursor': pagination.next_cursor,
+            'has_more': pagination.has_more,
+            'total': pagination.total
+        }
+    else:
+        result = {
+            'success': True,
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'current_page': page
+        }
+    if facets:
+        result['facets'] = [
+            {'category_id': facet_category_id, 'count': count}
+            for facet_category_id, count in sorted(pagination.facets.items(), key=lambda item: -item[1])
+        ]
+    
+    body = SerializationService.render(result, 'products', fragments)
+    search_result_cache.set(cache_key, body, catalog_version)
+    return set_cache_validators(json_response(body), etag, catalog_updated_at)
+
+# 输入联想返回的最大条数
+MAX_SUGGESTIONS = 20
+
+@api_bp.route('/products/suggest', methods=['GET'])
+def api_suggest_products():
+    """搜索框输入联想（只返回名称和货号，不访问数据库）"""
+    query = request.args.get('q', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), MAX_SUGGESTIONS)
+    
+    suggestions = SearchService.suggest(query, limit=limit) if query and limit > 0 else []
+    
+    return jsonify({
+        'success': True,
+        'suggestions': suggestions
+    })
+
+# 单次批量查找的最大编码数量
+MAX_LOOKUP_CODES = 1000
+
+def _lookup_product_dict(product):
+    """扫码查价返回的精简产品信息（不加载图片）"""
+    return {
+        'id': product.id,
+        'product_code': product.product_code,
+        'barcode': product.barcode,
+        'name': product.name,
+        'model': product.model,
+        'specification': product.specification,
+        'unit': product.unit,
+        'retail_price': product.retail_price,
+        'wholesale_price': product.wholesale_price,
+        'wholesale_min_qty': product.wholesale_min_qty,
+        'stock': product.stock
+    }
+
+@api_bp.route('/products/lookup', methods=['GET'])
+def api_lookup_product():
+    """按完整条码或货号精确查找产品（扫码枪/收银终端）"""
+    code = request.args.get('code', '').strip()
+    if not code:
+        return jsonify({
+            'success': False,
+            'message': '条码或货号不能为空'
+        }), 400
+    
+    product = SearchService.lookup_products([code])[code]
+    if not product:
+        return jsonify({
+            'success': False,
+            'message': f'未找到条码或货号为 {code} 的产品'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'product': _lookup_product_dict(product)
+    })
+
+@api_bp.route('/products/lookup', methods=['POST'])
+def api_lookup_products_batch():
+    """批量按条码或货号精确查找产品（盘点）"""
+    data = request.get_json(silent=True) or {}
+    codes = data.get('codes')
+    
+    if not isinstance(codes, list) or len(codes) == 0:
+        return jsonify({
+            'success': False,
+            'message': 'codes 必须是非空的编码列表'
+        }), 400
+    
+    if len(codes) > MAX_LOOKUP_CODES:
+        return jsonify({
+            'success': False,
+            'message': f'单次最多查找 {MAX_LOOKUP_CODES} 个编码'
+        }), 400
+    
+    codes = [str(code).strip() for code in codes]
+    products = SearchService.lookup_products(codes)
+    
+    results = []
+    not_found = []
+    for code in codes:
+        product = products.get(code)
+        if product is None:
+            not_found.append(code)
+        results.append({
+            'code': code,
+            'product': _lookup_product_dict(product) if product else None
         })
     
     return jsonify({
         'success': True,
-        'products': products_data,
-        'total': pagination.total,
-        'pages': pagination.pages,
-        'current_page': page
+        'results': results,
+        'not_found': not_found
     })
 
+# 批量获取产品时单次最多的 id 数量
+MAX_BULK_PRODUCT_IDS = 500
+
+def parse_product_ids(values):
+    """
+    解析产品 id 列表（去重并保持顺序）
+    :param values: id 列表，或逗号分隔的字符串
+    :raises ValueError: 包含非法 id
+    """
+    if isinstance(values, str):
+        values = [value for value in values.split(',') if value.strip()]
+    try:
+        return list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        raise ValueError('ids 必须是产品 id 列表')
+
+@api_bp.route('/products', methods=['GET', 'POST'])
+def api_get_products():
+    """
+    按 id 批量获取产品详情（购物车、订单页校验）
+    GET 使用 ?ids=1,2,3，购物车较大时用 POST {"ids": [...]}；
+    产品和图片各一次查询，结果按 id 返回
+    """
+    if request.method == 'POST':
+        values = (request.get_json(silent=True) or {}).get('ids')
+    else:
+        values = request.args.get('ids', '')
+    
+    try:
+        product_ids = parse_product_ids(values if values is not None else [])
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    if not product_ids:
+        return jsonify({
+            'success': False,
+            'message': 'ids 不能为空'
+        }), 400
+    
+    if len(product_ids) > MAX_BULK_PRODUCT_IDS:
+        return jsonify({
+            'success': False,
+            'message': f'单次最多获取 {MAX_BULK_PRODUCT_IDS} 个产品'
+        }), 400
+    
+    products = SearchService.load_products(product_ids)
+    fragments = dict(zip([product.id for product in products], SerializationService.detail_fragments(products)))
+    not_found = [product_id for product_id in product_ids if product_id not in fragments]
+    
+    return json_response(SerializationService.render({
+        'success': True,
+        'not_found': not_found
+    }, 'products', fragments))
+
+# 目录导出支持的格式
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+@api_bp.route('/products/export', methods=['GET'])
+def api_export_products():
+    """
+    流式导出产品目录（离线查价终端同步）
+    format=ndjson|csv；不带 since 时导出全部上架产品，
+    带 since 时只导出此后修改或删除的产品（删除的 status 为 deleted）。
+    响应头 X-Sync-Token 为本次同步时间，下次作为 since 传入
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'message': f'不支持的导出格式: {export_format}'
+        }), 400
+    
+    try:
+        since = ExportService.parse_since(request.args.get('since'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    # 在开始读取之前取同步时间，之后的写入留给下一次同步
+    sync_token = datetime.utcnow().isoformat()
+    records = ExportService.iter_records(since)
+    if export_format == 'csv':
+        chunks = ExportService.iter_csv(records)
+    else:
+        chunks = ExportService.iter_ndjson(records)
+    
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['X-Sync-Token'] = sync_token
+    if export_format == 'csv':
+        response.headers['Content-Disposition'] = 'attachment; filename=products.csv'
+    return response
+
 @api_bp.route('/products/<int:product_id>', methods=['GET'])
 def api_get_product(product_id):
     """获取单个产品详情"""
-    product = Product.query.get_or_404(product_id)
-    images = [img.image_url for img in product.images.order_by(ProductImage.sort_order)]
+    # 先只查修改时间，客户端缓存有效时不加载产品和图片
+    row = db.session.query(Product.updated_at).filter_by(id=product_id).first()
+    if row is None:
+        abort(404)
+    updated_at = row.updated_at
+    # 图片的增删改不会更新产品的 updated_at，但会递增目录版本号
+    catalog_version, catalog_updated_at = CatalogService.get_state()
+    etag = f"{product_id}-{catalog_version}-{updated_at.timestamp() if updated_at else 0}"
+    last_modified = max(filter(None, (updated_at, catalog_updated_at)), default=None)
+    response = not_modified_response(etag, last_modified)
+    if response is not None:
+        return response
     
-    return jsonify({
+    fragment = SerializationService.cached_detail_fragment(product_id, updated_at)
+    if fragment is None:
+        product = Product.query.get_or_404(product_id)
+        fragment = SerializationService.detail_fragments([product])[0]
+    
+    body = SerializationService.render({'success': True}, 'product', fragment)
+    return set_cache_validators(json_response(body), etag, last_modified)
+
+# 订单相关API
+def _replay_order_response(idempotency_key, request_hash):
+    """
+    幂等键已使用过时返回首次的响应，未使用过返回 None
+    同一个键用于不同的请求内容时返回 422
+    """
+    record = IdempotencyService.get(idempotency_key)
+    if record is None:
+        return None
+    if record.request_hash != request_hash:
+        return jsonify({
+            'success': False,
+            'message': '该 Idempotency-Key 已用于其他请求'
+        }), 422
+    # 首次请求提交订单后、保存响应前中断时，按订单重新生成响应
+    body = record.response or dumps({
         'success': True,
-        'product': {
-            'id': product.id,
-            'product_code': product.product_code,
-            'barcode': product.barcode,
-            'name': product.name,
-            'model': product.model,
-            'specification': product.specification,
-            'unit': product.unit,
-            'retail_price': product.retail_price,
-            'wholesale_price': product.wholesale_price,
-            'wholesale_min_qty': product.wholesale_min_qty,
-            'stock': product.stock,
-            'description': product.description,
-            'images': images,
-            'category_id': product.category_id
-        }
+        'order': OrderSerializationService.to_dict(record.order)
     })
+    response = Response(body, status=201, mimetype='application/json')
+    response.headers['Idempotency-Replayed'] = 'true'
+    return response
 
-# 订单相关API
 @api_bp.route('/orders', methods=['POST'])
 def api_create_order():
-    """创建订单API"""
+    """
+    创建订单API
+    请求头可带 Idempotency-Key：重试同一个请求时直接返回首次的响应，不会重复下单
+    """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({
+                'success': False,
+                'message': '订单格式不正确'
+            }), 400
+        
+        idempotency_key = request.headers.get('Idempotency-Key', '').strip() or None
+        request_hash = None
+        if idempotency_key:
+            if len(idempotency_key) > MAX_KEY_LENGTH:
+                return jsonify({
+                    'success': False,
+                    'message': f'Idempotency-Key 长度不能超过 {MAX_KEY_LENGTH}'
+                }), 400
+            request_hash = IdempotencyService.request_hash(data)
+            response = _replay_order_response(idempotency_key, request_hash)
+            if response is not None:
+                return response
         
         # 验证必填字段
         if not data.get('customer_name'):
@@ -112,38 +461,32 @@ def api_create_order():
             }), 400
         
         # 创建订单
-        order = OrderService.create_order(data)
+        try:
+            order = OrderService.create_order(data, idempotency_key=idempotency_key,
+                                              request_hash=request_hash)
+        except IntegrityError:
+            # 并发的重复请求已先提交，返回它的结果
+            db.session.rollback()
+            response = _replay_order_response(idempotency_key, request_hash) if idempotency_key else None
+            if response is None:
+                raise
+            return response
         
-        # 构建返回数据
-        items_data = []
-        for item in order.items:
-            items_data.append({
-                'product_id': item.product_id,
-                'product_name': item.product_name,
-                'product_code': item.product_code,
-                'quantity': item.quantity,
-                'unit_price': item.unit_price,
-                'subtotal': item.subtotal
-            })
-        
-        return jsonify({
+        body = dumps({
             'success': True,
-            'order': {
-                'id': order.id,
-                'order_no': order.order_no,
-                'customer_name': order.customer_name,
-                'customer_phone': order.customer_phone,
-                'customer_email': order.customer_email,
-                'customer_address': order.customer_address,
-                'total_amount': order.total_amount,
-                'total_quantity': order.total_quantity,
-                'status': order.status,
-                'notes': order.notes,
-                'created_at': order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'items': items_data
-            }
-        }), 201
+            'order': OrderSerializationService.to_dict(order)
+        })
+        if idempotency_key:
+            IdempotencyService.save_response(idempotency_key, body)
+        
+        return Response(body, status=201, mimetype='application/json')
         
+    except InsufficientStockError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'shortages': e.shortages
+        }), 409
     except ValueError as e:
         return jsonify({
             'success': False,
@@ -155,39 +498,69 @@ def api_create_order():
             'message': f'创建订单失败: {str(e)}'
         }), 500
 
+# 批量下单每次最多的订单数
+MAX_BATCH_ORDERS = 200
+
+@api_bp.route('/orders/batch', methods=['POST'])
+def api_create_orders_batch():
+    """
+    批量创建订单API（批发业务员同步离线订单）
+    请求体 {"orders": [订单, ...]}，每个订单格式同 POST /api/orders，最多 MAX_BATCH_ORDERS 个。
+    所有订单在一个事务中写入；校验失败或库存不足的订单不写入，按提交顺序返回每个订单的结果。
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        orders_data = data.get('orders')
+        if not isinstance(orders_data, list) or not orders_data:
+            return jsonify({
+                'success': False,
+                'message': '订单列表不能为空'
+            }), 400
+        if len(orders_data) > MAX_BATCH_ORDERS:
+            return jsonify({
+                'success': False,
+                'message': f'每次最多提交 {MAX_BATCH_ORDERS} 个订单'
+            }), 400
+        if not all(isinstance(order_data, dict) for order_data in orders_data):
+            return jsonify({
+                'success': False,
+                'message': '订单格式不正确'
+            }), 400
+        
+        results = OrderService.create_orders(orders_data)
+        created = sum(1 for result in results if result['success'])
+        
+        return jsonify({
+            'success': True,
+            'created': created,
+            'failed': len(results) - created,
+            'results': results
+        })
+        
+    except InsufficientStockError as e:
+        return jsonify({
+            'success': False,
+            'message': f'{str(e)}，请重新提交',
+            'shortages': e.shortages
+        }), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': f'批量创建订单失败: {str(e)}'
+        }), 500
+
 @api_bp.route('/orders/<order_no>', methods=['GET'])
 def api_get_order(order_no):
     """获取订单详情"""
-    order = Order.query.filter_by(order_no=order_no).first_or_404()
+    order, items = OrderSerializationService.load(order_no=order_no)
+    if order is None:
+        abort(404)
     
-    items_data = []
-    for item in order.items:
-        items_data.append({
-            'product_id': item.product_id,
-            'product_name': item.product_name,
-            'product_code': item.product_code,
-            'quantity': item.quantity,
-            'unit_price': item.unit_price,
-            'subtotal': item.subtotal
-        })
-    
-    return jsonify({
+    return json_response(dumps({
         'success': True,
-        'order': {
-            'id': order.id,
-            'order_no': order.order_no,
-            'customer_name': order.customer_name,
-            'customer_phone': order.customer_phone,
-            'customer_email': order.customer_email,
-            'customer_address': order.customer_address,
-            'total_amount': order.total_amount,
-            'total_quantity': order.total_quantity,
-            'status': order.status,
-            'notes': order.notes,
-            'created_at': order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'items': items_data
-        }
-    })
+        'order': OrderSerializationService.to_dict(order, items)
+    }))
 
 # 统计API
 @api_bp.route('/statistics', methods=['GET'])
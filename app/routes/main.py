@@ -1,5 +1,9 @@
-from flask import Blueprint, render_template, request, jsonify
-from app.models import Product, Category, Order, SystemSetting
+from flask import Blueprint, render_template, request, Response, abort
+from app.models import Product, Category, SystemSetting
+from app.services.product_service import ProductService
+from app.services.serialization_service import SerializationService
+from app.services.search_service import SearchService
+from app.services.order_serialization_service import OrderSerializationService
 
 main_bp = Blueprint('main', __name__)
 
@@ -16,56 +20,21 @@ def search():
     category_id = request.args.get('category_id', type=int)
     page = request.args.get('page', 1, type=int)
     per_page = 20
+    sort = 'relevance' if request.args.get('sort') == 'relevance' else 'newest'
     
-    # 构建查询
-    products_query = Product.query.filter_by(status='active')
-    
-    if query:
-        products_query = products_query.filter(
-            (Product.name.contains(query)) |
-            (Product.product_code.contains(query)) |
-            (Product.barcode.contains(query)) |
-            (Product.model.contains(query))
-        )
-    
-    if category_id:
-        products_query = products_query.filter_by(category_id=category_id)
-    
-    # 分页
-    pagination = products_query.order_by(Product.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 搜索并分页（关键词走倒排索引）
+    pagination = SearchService.paginate(query, category_id=category_id, page=page,
+                                        per_page=per_page, sort=sort)
     
     # 返回JSON或HTML
     if request.headers.get('Content-Type') == 'application/json' or request.args.get('format') == 'json':
-        products_data = []
-        for product in pagination.items:
-            images = [img.image_url for img in product.images.order_by(ProductImage.sort_order)]
-            primary_image = images[0] if images else None
-            
-            products_data.append({
-                'id': product.id,
-                'product_code': product.product_code,
-                'barcode': product.barcode,
-                'name': product.name,
-                'model': product.model,
-                'specification': product.specification,
-                'unit': product.unit,
-                'retail_price': product.retail_price,
-                'wholesale_price': product.wholesale_price,
-                'wholesale_min_qty': product.wholesale_min_qty,
-                'stock': product.stock,
-                'description': product.description,
-                'primary_image': primary_image,
-                'all_images': images
-            })
-        
-        return jsonify({
-            'products': products_data,
+        # 与搜索接口共用缓存的产品 JSON 片段
+        body = SerializationService.render({
             'total': pagination.total,
             'pages': pagination.pages,
             'current_page': page
-        })
+        }, 'products', SerializationService.list_fragments(pagination.items))
+        return Response(body, mimetype='application/json')
     
     return render_template('search_results.html', 
                          products=pagination.items,
@@ -77,7 +46,7 @@ def search():
 def product_detail(product_id):
     """产品详情页"""
     product = Product.query.get_or_404(product_id)
-    images = product.images.order_by(ProductImage.sort_order).all()
+    images = ProductService.get_images_map([product.id])[product.id]
     primary_image = images[0] if images else None
     
     return render_template('product_detail.html',
@@ -98,5 +67,7 @@ def order():
 @main_bp.route('/order/success/<order_no>')
 def order_success(order_no):
     """订单成功页面"""
-    order = Order.query.filter_by(order_no=order_no).first_or_404()
-    return render_template('order_success.html', order=order)
+    order, items = OrderSerializationService.load(order_no=order_no)
+    if order is None:
+        abort(404)
+    return render_template('order_success.html', order=order, items=items)
@@ -0,0 +1,209 @@
+"""
+订单归档服务（冷热分层存储）
+下单超过保留期（ORDER_HOT_DAYS，默认 90 天）的订单及明细由归档任务迁入 orders_archive /
+order_items_archive，orders、order_items 只保留近期的热数据，列表、仪表盘和统计的常用查询只扫描小表。
+PostgreSQL 上归档表按下单月份分区（归档时自动创建分区），按日期范围查询只扫描相关月份；
+SQLite 不支持分区，归档表为普通表。
+统计和订单列表按日期范围决定查询哪一层：范围不早于热表最早的订单时只查热表，
+不晚于归档表最新的订单时只查归档表，跨越两层时 UNION ALL 合并。
+"""
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+from flask import current_app
+from sqlalchemy import select, insert, delete, union_all, literal, func, and_, text
+from app.models import (db, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, NotificationOutbox,
+                        OrderIdempotencyKey, OrderSearchTerm)
+from app.services.pagination_service import PaginationService, CursorPage
+
+
+# 每批迁移的订单数（每批一个事务）
+ARCHIVE_BATCH_SIZE = 1000
+
+# 热表与归档表共有的列
+ORDER_COLUMNS = tuple(column.name for column in Order.__table__.columns)
+ORDER_ITEM_COLUMNS = tuple(column.name for column in OrderItem.__table__.columns)
+
+# 一层存储：订单模型、明细模型、明细与订单的关联条件
+OrderTier = namedtuple('OrderTier', ['order', 'item', 'join'])
+
+HOT_TIER = OrderTier(Order, OrderItem, OrderItem.order_id == Order.id)
+ARCHIVE_TIER = OrderTier(
+    ArchivedOrder, ArchivedOrderItem,
+    and_(ArchivedOrderItem.order_id == ArchivedOrder.id,
+         ArchivedOrderItem.order_created_at == ArchivedOrder.created_at)
+)
+
+
+def as_datetime(value):
+    """日期转为当天零点（统计接口传入的是 date）"""
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+class ArchiveService:
+
+    @staticmethod
+    def archive_newest():
+        """归档表中最晚的下单时间，没有归档数据时为 None"""
+        return db.session.query(func.max(ArchivedOrder.created_at)).scalar()
+
+    @staticmethod
+    def tiers(start=None, end=None):
+        """
+        下单时间范围 [start, end] 涉及的存储层
+        :return: [OrderTier]，至少包含热表
+        """
+        start, end = as_datetime(start), as_datetime(end)
+        tiers = []
+        hot_oldest = db.session.query(func.min(Order.created_at)).scalar()
+        if hot_oldest is not None and (end is None or end >= hot_oldest):
+            tiers.append(HOT_TIER)
+        archive_newest = ArchiveService.archive_newest()
+        if archive_newest is not None and (start is None or start <= archive_newest):
+            tiers.append(ARCHIVE_TIER)
+        return tiers or [HOT_TIER]
+
+    @staticmethod
+    def _date_filters(model, start, end, statuses):
+        filters = []
+        if statuses:
+            filters.append(model.status.in_(statuses))
+        if start:
+            filters.append(model.created_at >= start)
+        if end:
+            filters.append(model.created_at <= end)
+        return filters
+
+    @staticmethod
+    def _union(selects):
+        return (selects[0] if len(selects) == 1 else union_all(*selects)).subquery()
+
+    @staticmethod
+    def order_rows(start=None, end=None, statuses=None):
+        """
+        下单时间范围内的订单（涉及的各层 UNION ALL，筛选条件下推到每一层）
+        :param statuses: 只包含这些状态的订单
+        :return: 子查询，列同 orders 表
+        """
+        return ArchiveService._union([
+            select(*[tier.order.__table__.c[name] for name in ORDER_COLUMNS]).where(
+                *ArchiveService._date_filters(tier.order, start, end, statuses)
+            )
+            for tier in ArchiveService.tiers(start, end)
+        ])
+
+    @staticmethod
+    def order_lines(start=None, end=None, statuses=None):
+        """
+        下单时间范围内的订单明细
+        :return: 子查询，列为 order_id、created_at、status、product_id、quantity、subtotal
+        """
+        return ArchiveService._union([
+            select(
+                tier.item.order_id, tier.order.created_at, tier.order.status,
+                tier.item.product_id, tier.item.quantity, tier.item.subtotal
+            ).join(tier.order, tier.join).where(
+                *ArchiveService._date_filters(tier.order, start, end, statuses)
+            )
+            for tier in ArchiveService.tiers(start, end)
+        ])
+
+    @staticmethod
+    def paginate_orders(hot_query, archive_query, cursor=None, per_page=20):
+        """
+        订单列表跨冷热两层按 (created_at, id) 倒序分页，游标与 PaginationService.keyset_paginate 通用
+        热表已取满一页且都比归档数据新时（绝大多数请求）不查询归档表
+        :param hot_query: orders 上带筛选条件的查询
+        :param archive_query: orders_archive 上同样筛选条件的查询
+        """
+        page = PaginationService.keyset_paginate(hot_query, Order, cursor=cursor, per_page=per_page)
+        archive_newest = ArchiveService.archive_newest()
+        if archive_newest is None or (page.has_more and page.items[-1].created_at > archive_newest):
+            return page
+
+        archived = PaginationService.keyset_paginate(archive_query, ArchivedOrder, cursor=cursor, per_page=per_page)
+        merged = sorted(page.items + archived.items, key=lambda order: (order.created_at, order.id), reverse=True)
+        items = merged[:per_page]
+        # 两层各多取了一条，任一层还有数据或合并后超过一页即还有下一页
+        next_cursor = None
+        if items and (page.has_more or archived.has_more or len(merged) > per_page):
+            next_cursor = PaginationService.encode_cursor(items[-1].created_at, items[-1].id)
+        return CursorPage(items, next_cursor=next_cursor)
+
+    @staticmethod
+    def _ensure_partitions(first, last):
+        """PostgreSQL 上为 [first, last] 涉及的月份创建归档表分区"""
+        if db.engine.dialect.name != 'postgresql':
+            return
+        month = date(first.year, first.month, 1)
+        while month <= last.date():
+            next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+            for table in (ArchivedOrder.__tablename__, ArchivedOrderItem.__tablename__):
+                db.session.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {table}_{month:%Y%m} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month}') TO ('{next_month}')"
+                ))
+            month = next_month
+
+    @staticmethod
+    def _archive_where(condition):
+        """
+        在一个事务中把满足 condition 的订单及明细迁入归档表，并删除其关联的通知、幂等键和检索词
+        :param condition: 以 created_at 列为参数、返回筛选条件的函数
+        :return: 迁移的订单数
+        """
+        first, last = db.session.query(
+            func.min(Order.created_at), func.max(Order.created_at)
+        ).filter(condition(Order.created_at)).one()
+        if first is None:
+            return 0
+        ArchiveService._ensure_partitions(first, last)
+
+        now = datetime.utcnow()
+        db.session.execute(insert(ArchivedOrder).from_select(
+            ORDER_COLUMNS + ('archived_at',),
+            select(*[Order.__table__.c[name] for name in ORDER_COLUMNS], literal(now)).where(
+                condition(Order.created_at)
+            )
+        ))
+        db.session.execute(insert(ArchivedOrderItem).from_select(
+            ORDER_ITEM_COLUMNS + ('order_created_at',),
+            select(*[OrderItem.__table__.c[name] for name in ORDER_ITEM_COLUMNS], Order.created_at).join(
+                Order, HOT_TIER.join
+            ).where(condition(Order.created_at))
+        ))
+
+        order_ids = select(Order.id).where(condition(Order.created_at))
+        for model in (OrderItem, NotificationOutbox, OrderIdempotencyKey, OrderSearchTerm):
+            db.session.execute(delete(model).where(model.order_id.in_(order_ids)))
+        moved = db.session.execute(delete(Order).where(condition(Order.created_at))).rowcount
+        db.session.commit()
+        return moved
+
+    @staticmethod
+    def archive_orders(hot_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        归档下单时间早于保留期的订单，按下单时间从早到晚分批迁移，每批一个事务。
+        每批迁移某个时间点之前的全部订单，任何时刻 orders 中都没有比归档数据更早的订单。
+        :param hot_days: 热数据保留天数，默认 ORDER_HOT_DAYS
+        :return: 归档的订单数
+        """
+        if hot_days is None:
+            hot_days = current_app.config['ORDER_HOT_DAYS']
+        cutoff = datetime.utcnow() - timedelta(days=hot_days)
+        # 至少保留最新的订单：热表清空后 SQLite 会复用订单 id，与归档的订单冲突
+        newest = db.session.query(func.max(Order.created_at)).scalar()
+        if newest is None:
+            return 0
+        cutoff = min(cutoff, newest)
+
+        total = 0
+        while True:
+            # 本批上界：第 batch_size 条订单的下单时间（同一时间的订单同批迁移）
+            upper = db.session.query(Order.created_at).filter(
+                Order.created_at < cutoff
+            ).order_by(Order.created_at, Order.id).offset(batch_size).limit(1).scalar()
+            if upper is None:
+                return total + ArchiveService._archive_where(lambda column: column < cutoff)
+            total += ArchiveService._archive_where(lambda column: column <= upper)
@@ -0,0 +1,57 @@
+"""
+进程内缓存
+带容量上限的 LRU 缓存，按目录版本号整体失效
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """线程安全的 LRU 缓存
+
+    每次读写都带上当前目录版本号，版本号变化时清空全部条目，
+    这样其他 worker 的写入也能让本进程的缓存失效。
+    键本身已能区分新旧数据时（如包含 updated_at）可以不传版本号。
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.version = None
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._data.clear()
+            self.version = version
+
+    def get(self, key, version=None):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            self._check_version(version)
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, version=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
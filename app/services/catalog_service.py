@@ -0,0 +1,73 @@
+"""
+产品目录版本服务
+目录版本号保存在数据库中，所有 gunicorn worker 共享；
+产品、导入、图片的写入在同一事务内递增版本号，进程内缓存据此判断是否失效。
+下单扣减/取消归还库存另记库存版本号，在订单提交后用独立的短事务递增，
+不在订单事务中持有版本行的锁；搜索索引不含库存，只随目录版本号同步
+"""
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.models import db, CatalogVersion
+
+
+# 目录版本号固定存放在 id=1 的行
+CATALOG_VERSION_ID = 1
+# 库存版本号固定存放在 id=2 的行
+STOCK_VERSION_ID = 2
+
+
+class CatalogService:
+
+    @staticmethod
+    def get_version():
+        """获取当前目录版本号（每次都读数据库，避免会话缓存导致读到旧值）"""
+        version = db.session.query(CatalogVersion.version).filter_by(id=CATALOG_VERSION_ID).scalar()
+        return version or 0
+
+    @staticmethod
+    def get_state():
+        """
+        获取包含库存变化的数据版本号及最后修改时间（用于搜索结果缓存、HTTP 条件请求和目录快照）
+        两个版本号都只增不减，其和随任一变化递增
+        :return: (version, updated_at)，尚无版本记录时为 (0, None)
+        """
+        row = db.session.query(
+            func.sum(CatalogVersion.version), func.max(CatalogVersion.updated_at)
+        ).filter(CatalogVersion.id.in_((CATALOG_VERSION_ID, STOCK_VERSION_ID))).one()
+        return row[0] or 0, row[1]
+
+    @staticmethod
+    def bump_version():
+        """
+        在当前事务中递增目录版本号，由调用方随业务数据一起提交
+        :return: None
+        """
+        updated = CatalogVersion.query.filter_by(id=CATALOG_VERSION_ID).update({
+            CatalogVersion.version: CatalogVersion.version + 1,
+            CatalogVersion.updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(CatalogVersion(id=CATALOG_VERSION_ID, version=1))
+
+    @staticmethod
+    def bump_stock_version():
+        """
+        递增库存版本号（独立的短事务，在订单提交之后调用）
+        订单事务中不写版本行，并发下单只在各自的商品行上加锁
+        """
+        table = CatalogVersion.__table__
+        while True:
+            with db.engine.begin() as conn:
+                updated = conn.execute(table.update().where(table.c.id == STOCK_VERSION_ID).values(
+                    version=table.c.version + 1, updated_at=datetime.utcnow()
+                )).rowcount
+            if updated:
+                return
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(table.insert().values(id=STOCK_VERSION_ID, version=1, updated_at=datetime.utcnow()))
+                return
+            except IntegrityError:
+                # 其他进程同时创建了该行，重新走 UPDATE
+                continue
@@ -0,0 +1,91 @@
+"""
+产品目录导出服务
+供离线查价终端同步整个目录：逐批从数据库读取并流式输出 NDJSON/CSV，内存占用与产品数量无关；
+带 since 时只输出此后修改过的产品和已删除的产品（增量同步）
+"""
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from app.models import db, Product, ProductTombstone
+
+
+# 导出的列（CSV 表头顺序）
+EXPORT_COLUMNS = (
+    'id', 'product_code', 'barcode', 'name', 'model', 'specification', 'unit',
+    'retail_price', 'wholesale_price', 'wholesale_min_qty', 'stock', 'category_id',
+    'status', 'updated_at'
+)
+# 已删除产品的状态值
+DELETED_STATUS = 'deleted'
+# 每批从数据库读取的行数
+STREAM_BATCH_SIZE = 1000
+# 增量同步向前多取的时间，覆盖同步开始时尚未提交的写入
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+class ExportService:
+
+    @staticmethod
+    def parse_since(value):
+        """
+        解析 since 参数（ISO 格式时间，通常是上次导出返回的同步时间）
+        :return: datetime，未传时返回 None
+        :raises ValueError: 格式错误
+        """
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError('since 参数格式错误，应为 ISO 格式时间')
+
+    @staticmethod
+    def iter_records(since=None):
+        """
+        逐条产出导出记录（dict）
+        全量时只包含上架的产品；增量时先输出删除记录（status 为 deleted），
+        再输出修改过的产品（包含下架的，终端据 status 处理）
+        :param since: 上次同步时间，None 表示全量
+        """
+        if since is not None:
+            tombstones = db.session.query(
+                ProductTombstone.product_id, ProductTombstone.product_code, ProductTombstone.deleted_at
+            ).filter(ProductTombstone.deleted_at >= since - SYNC_OVERLAP).order_by(ProductTombstone.id)
+            for tombstone in tombstones.yield_per(STREAM_BATCH_SIZE):
+                record = dict.fromkeys(EXPORT_COLUMNS)
+                record.update(id=tombstone.product_id, product_code=tombstone.product_code,
+                              status=DELETED_STATUS, updated_at=tombstone.deleted_at)
+                yield record
+
+        products = db.session.query(*[getattr(Product, column) for column in EXPORT_COLUMNS])
+        if since is None:
+            products = products.filter(Product.status == 'active')
+        else:
+            products = products.filter(Product.updated_at >= since - SYNC_OVERLAP)
+        for row in products.order_by(Product.id).yield_per(STREAM_BATCH_SIZE):
+            yield row._asdict()
+
+    @staticmethod
+    def iter_ndjson(records):
+        """每条记录输出一行 JSON"""
+        for record in records:
+            if record['updated_at'] is not None:
+                record['updated_at'] = record['updated_at'].isoformat()
+            yield json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+    @staticmethod
+    def iter_csv(records):
+        """输出带表头的 CSV，每 STREAM_BATCH_SIZE 行输出一块"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for i, record in enumerate(records, 1):
+            if record['updated_at'] is not None:
+                record['updated_at'] = record['updated_at'].isoformat()
+            writer.writerow([record[column] for column in EXPORT_COLUMNS])
+            if i % STREAM_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
@@ -0,0 +1,34 @@
+"""
+下单幂等服务
+客户端在请求头 Idempotency-Key 中携带唯一键，网络重试时服务端直接返回首次的响应，
+不会重复下单。幂等键按主键查询，只需一次索引查找。
+"""
+import hashlib
+import json
+from app.models import db, OrderIdempotencyKey
+
+
+# 幂等键最大长度
+MAX_KEY_LENGTH = 100
+
+
+class IdempotencyService:
+
+    @staticmethod
+    def request_hash(data):
+        """请求内容摘要（键排序后的 JSON 的 sha256）"""
+        canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def get(key):
+        """按幂等键查找记录，不存在时返回 None"""
+        return db.session.get(OrderIdempotencyKey, key)
+
+    @staticmethod
+    def save_response(key, body):
+        """保存首次请求的响应（订单提交之后调用）"""
+        OrderIdempotencyKey.query.filter_by(key=key).update(
+            {OrderIdempotencyKey.response: body}, synchronize_session=False
+        )
+        db.session.commit()
@@ -1,5 +1,7 @@
 from app.models import db, User, SystemSetting, Category, Product, ProductImage, Order, OrderItem
 from flask import current_app
+from app.services.order_search_service import OrderSearchService
+from app.services.product_service import ProductService
 
 def create_default_admin():
     """创建默认管理员账户"""
@@ -356,6 +358,7 @@ def create_sample_products():
             description=prod_data['description'],
             category_id=category_map.get(prod_data['category']).id if prod_data['category'] in category_map else None
         )
+        ProductService.update_search_key(product)
         db.session.add(product)
         db.session.flush()  # 获取product的ID
 
@@ -473,6 +476,8 @@ def create_sample_orders():
         )
         db.session.add(order)
         db.session.flush()  # 获取order的ID
+        # 写入订单搜索检索词
+        OrderSearchService.index_orders([order])
 
         # 创建订单项
         for item_data in order_data['items']:
@@ -3,6 +3,12 @@ from flask_mail import Message
 from app.models import db, SystemSetting, Order
 import requests
 
+# 各通知渠道的启用开关（系统设置项）
+CHANNEL_ENABLED_SETTINGS = {
+    'email': 'MAIL_NOTIFICATION_ENABLED',
+    'sms': 'SMS_NOTIFICATION_ENABLED'
+}
+
 class NotificationService:
 
     @staticmethod
@@ -11,6 +17,11 @@ class NotificationService:
         setting = SystemSetting.query.filter_by(key=key).first()
         return setting.value if setting else default
 
+    @staticmethod
+    def channel_enabled(channel):
+        """通知渠道（email / sms）是否已启用"""
+        return NotificationService.get_setting(CHANNEL_ENABLED_SETTINGS[channel], 'false') == 'true'
+
     @staticmethod
     def send_email_notification(order):
         """发送邮件通知"""
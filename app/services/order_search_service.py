@@ -0,0 +1,226 @@
+"""
+订单搜索索引服务
+后台订单搜索按订单号、客户姓名、电话查询，原来的 contains 查询每次都全表扫描 orders。
+改为在 order_search_terms 表中为每个订单写入检索词，查询只做 (term, order_id) 主键上的范围查找：
+- 订单号前缀：直接在 orders.order_no 唯一索引上做范围查询（命中不多时取出后排序）
+- 订单号后缀：'o:' + 倒序的订单号，后缀匹配转为前缀范围查询
+- 电话后几位：'p:' + 倒序的电话数字
+- 客户姓名：'n:' + 单字和相邻两字，查询词的所有片段都命中才算匹配
+命中订单很多的宽泛查询改为按时间倒序扫描，取满一页即停止。
+检索词与订单在同一事务中写入；升级前的订单、脚本直接插入的订单由 catch_up 补齐
+（scripts/rebuild_order_search.py，Docker 容器启动时自动运行），不在搜索请求中检查。
+"""
+import re
+from sqlalchemy import insert, select, union_all, func, or_
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Order, OrderSearchTerm
+from app.services.search_service import normalize
+
+
+ORDER_NO_SUFFIX = 'o:'
+PHONE_SUFFIX = 'p:'
+NAME_GRAM = 'n:'
+# 客户姓名切分的最大片段长度
+NAME_GRAM_SIZE = 2
+# 检索词命中订单数超过该值时改为按时间倒序扫描（见 filter_orders）
+DENSE_MATCH_LIMIT = 1000
+# 订单号前缀命中超过该值时改为按时间倒序扫描；
+# 在 order_no 索引上取出这么多行再排序只需几毫秒，而一天的订单号（如 ORD20250408）常有上千个
+ORDER_NO_RANGE_LIMIT = 20000
+# 重建/补齐索引时每批处理的订单数
+INDEX_BATCH_SIZE = 1000
+
+
+def phone_digits(phone):
+    """电话只保留数字"""
+    return re.sub(r'\D', '', phone or '')
+
+
+def name_grams(name, query=False):
+    """
+    客户姓名的 n-gram
+    :param query: 查询词只取最长的片段（单字查询取单字），全部命中即匹配
+    """
+    text = re.sub(r'\s+', '', normalize(name))
+    if not text:
+        return set()
+    if query:
+        size = min(len(text), NAME_GRAM_SIZE)
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+    return {text[i:i + size] for size in range(1, NAME_GRAM_SIZE + 1) for i in range(len(text) - size + 1)}
+
+
+def prefix_range(column, prefix):
+    """前缀匹配写成范围条件，能走 B-tree 索引（LIKE 'x%' 在 SQLite 默认不走索引）"""
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return db.and_(column >= prefix, column < upper)
+
+
+class OrderSearchService:
+
+    # (数据库引擎, 已确认都有检索词的最大订单 id)，见 catch_up
+    _checked_through = (None, 0)
+
+    @staticmethod
+    def terms_for(order_no, customer_name, customer_phone):
+        """计算一个订单的检索词"""
+        terms = {ORDER_NO_SUFFIX + order_no[::-1].lower()}
+        digits = phone_digits(customer_phone)
+        if digits:
+            terms.add(PHONE_SUFFIX + digits[::-1])
+        terms.update(NAME_GRAM + gram for gram in name_grams(customer_name))
+        return terms
+
+    @staticmethod
+    def index_orders(orders):
+        """
+        写入订单的检索词（一条批量 INSERT，不提交，随订单一起提交）
+        :param orders: 已有 id 的订单，或含 id、order_no、customer_name、customer_phone 的行
+        """
+        rows = [
+            {'term': term, 'order_id': order.id}
+            for order in orders
+            for term in OrderSearchService.terms_for(order.order_no, order.customer_name, order.customer_phone)
+        ]
+        if rows:
+            db.session.execute(insert(OrderSearchTerm), rows)
+
+    @staticmethod
+    def _term_ranges(text):
+        """订单号后缀、电话后几位的检索词范围条件"""
+        ranges = [prefix_range(OrderSearchTerm.term, ORDER_NO_SUFFIX + text[::-1])]
+        digits = phone_digits(text)
+        if digits and digits == text:
+            ranges.append(prefix_range(OrderSearchTerm.term, PHONE_SUFFIX + digits[::-1]))
+        return ranges
+
+    @staticmethod
+    def _match_select(text):
+        """检索词命中的订单 id 查询（按 (term, order_id) 主键范围查找）"""
+        grams = name_grams(text, query=True)
+        selects = [select(OrderSearchTerm.order_id).where(condition) for condition in OrderSearchService._term_ranges(text)]
+        if len(grams) == 1:
+            selects.append(select(OrderSearchTerm.order_id).where(OrderSearchTerm.term == NAME_GRAM + grams.pop()))
+        else:
+            selects.append(
+                select(OrderSearchTerm.order_id).where(
+                    OrderSearchTerm.term.in_([NAME_GRAM + gram for gram in grams])
+                ).group_by(OrderSearchTerm.order_id).having(
+                    func.count(OrderSearchTerm.term) == len(grams)
+                )
+            )
+        return union_all(*selects)
+
+    @staticmethod
+    def _count_upto(condition, column, limit):
+        """满足条件的行数，最多数到 limit + 1（只走索引，不随命中数增长）"""
+        return db.session.query(func.count()).select_from(
+            select(column).where(condition).limit(limit + 1).subquery()
+        ).scalar()
+
+    @staticmethod
+    def _is_dense(text):
+        """
+        检索词命中的订单是否可能超过 DENSE_MATCH_LIMIT
+        各条件分别最多数 DENSE_MATCH_LIMIT + 1 条；客户姓名取最少的片段计数（命中数的上限），
+        不对全部片段做 GROUP BY（常见姓氏的单字片段有上万条）
+        """
+        count = sum(
+            OrderSearchService._count_upto(condition, OrderSearchTerm.order_id, DENSE_MATCH_LIMIT)
+            for condition in OrderSearchService._term_ranges(text)
+        )
+        name_count = DENSE_MATCH_LIMIT + 1
+        for gram in name_grams(text, query=True):
+            name_count = min(name_count, OrderSearchService._count_upto(
+                OrderSearchTerm.term == NAME_GRAM + gram, OrderSearchTerm.order_id, DENSE_MATCH_LIMIT
+            ))
+            if name_count <= DENSE_MATCH_LIMIT:
+                break
+        return count + name_count > DENSE_MATCH_LIMIT
+
+    @staticmethod
+    def like_filter(model, orders_query, query):
+        """
+        逐行匹配的搜索条件（与检索词语义相同），用于命中很多的查询和没有检索词的归档订单
+        只加上可能命中的条件，逐行判断尽量少：订单号只含字母数字（按大写比较），电话只含数字，
+        查询词没有大小写之分（如中文姓名）时不对每行做 lower()
+        :param model: Order 或 ArchivedOrder
+        """
+        text = re.sub(r'\s+', '', normalize(query))
+        if not text:
+            return orders_query
+        conditions = []
+        if text.isascii() and text.isalnum():
+            conditions.append(prefix_range(model.order_no, text.upper()))
+            conditions.append(model.order_no.endswith(text.upper()))
+        if phone_digits(text) == text:
+            conditions.append(model.customer_phone.endswith(text))
+        if text == text.upper():
+            conditions.append(model.customer_name.contains(text, autoescape=True))
+        else:
+            conditions.append(model.customer_name.icontains(text, autoescape=True))
+        return orders_query.filter(or_(*conditions))
+
+    @staticmethod
+    def filter_orders(orders_query, query):
+        """
+        给订单查询加上搜索条件
+        :param query: 订单号（前缀或后缀）、电话后几位或客户姓名
+        """
+        text = re.sub(r'\s+', '', normalize(query))
+        if not text:
+            return orders_query
+
+        order_no_range = prefix_range(Order.order_no, text.upper())
+        if (OrderSearchService._count_upto(order_no_range, Order.id, ORDER_NO_RANGE_LIMIT) > ORDER_NO_RANGE_LIMIT
+                or OrderSearchService._is_dense(text)):
+            # 命中很多（如只输入了 "ORD" 或一个常见姓氏）时，取出全部 id 再排序反而慢；
+            # 直接按 (created_at, id) 索引倒序扫描并逐行判断，很快就能取满一页
+            return OrderSearchService.like_filter(Order, orders_query, text)
+        # 订单号前缀在 order_no 索引上取范围，其余条件查检索词（SQLite 用 MULTI-INDEX OR 分别走索引）
+        return orders_query.filter(or_(order_no_range, Order.id.in_(OrderSearchService._match_select(text))))
+
+    @staticmethod
+    def _index_missing(after_id):
+        """为 id 大于 after_id、还没有检索词的订单分批写入检索词并提交，返回处理的订单数"""
+        has_terms = select(OrderSearchTerm.order_id).where(OrderSearchTerm.order_id == Order.id).exists()
+        count = 0
+        while True:
+            rows = db.session.query(
+                Order.id, Order.order_no, Order.customer_name, Order.customer_phone
+            ).filter(Order.id > after_id, ~has_terms).order_by(Order.id).limit(INDEX_BATCH_SIZE).all()
+            if not rows:
+                return count
+            OrderSearchService.index_orders(rows)
+            db.session.commit()
+            count += len(rows)
+            after_id = rows[-1].id
+
+    @staticmethod
+    def catch_up():
+        """
+        补齐没有检索词的订单（升级前的订单、初始化数据、脚本直接插入的订单）
+        进程内第一次调用时检查全部订单，之后只检查上次检查时最大 id 之后的订单
+        :return: 补齐的订单数
+        """
+        engine, checked_id = OrderSearchService._checked_through
+        if engine is not db.engine:
+            # 测试中多次 create_app 切换数据库时重新全量检查
+            checked_id = 0
+        newest_id = db.session.query(func.max(Order.id)).scalar() or 0
+        try:
+            count = OrderSearchService._index_missing(checked_id)
+        except IntegrityError:
+            # 其他进程同时在补齐，下次调用再检查
+            db.session.rollback()
+            return 0
+        OrderSearchService._checked_through = (db.engine, newest_id)
+        return count
+
+    @staticmethod
+    def rebuild():
+        """清空并重建全部订单的检索词，返回订单数"""
+        OrderSearchTerm.query.delete()
+        db.session.commit()
+        OrderSearchService._checked_through = (None, 0)
+        return OrderSearchService._index_missing(0)
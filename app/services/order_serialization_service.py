@@ -0,0 +1,63 @@
+"""
+订单序列化服务
+下单接口、订单查询接口、幂等重放、后台订单详情和下单成功页共用同一份订单数据：
+订单一次查询、明细一次查询；刚创建的订单直接使用内存中的明细，不再回查数据库。
+热表中找不到的订单再到归档表中查找（见 ArchiveService）
+"""
+from app.models import db, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+
+# 订单和明细输出的字段
+ORDER_COLUMNS = (
+    'id', 'order_no', 'customer_name', 'customer_phone', 'customer_email', 'customer_address',
+    'total_amount', 'total_quantity', 'status', 'notes'
+)
+ORDER_ITEM_COLUMNS = ('product_id', 'product_name', 'product_code', 'quantity', 'unit_price', 'subtotal')
+
+
+class OrderSerializationService:
+
+    @staticmethod
+    def load_items(order_id, archived=False):
+        """
+        按插入顺序加载订单明细（一次查询）
+        :param archived: 是否为归档订单
+        """
+        model = ArchivedOrderItem if archived else OrderItem
+        return model.query.filter_by(order_id=order_id).order_by(model.id).all()
+
+    @staticmethod
+    def load(order_no=None, order_id=None):
+        """
+        加载订单及其明细（两次查询，已归档的订单多查一次热表）
+        :return: (order, items)，订单不存在时返回 (None, [])
+        """
+        if order_id is not None:
+            order = db.session.get(Order, order_id) or ArchivedOrder.query.filter_by(id=order_id).first()
+        else:
+            order = (Order.query.filter_by(order_no=order_no).first()
+                     or ArchivedOrder.query.filter_by(order_no=order_no).first())
+        if order is None:
+            return None, []
+        return order, OrderSerializationService.load_items(order.id, archived=order.archived)
+
+    @staticmethod
+    def items_of(order):
+        """订单明细：刚创建的订单用内存中的明细（见 OrderService.create_order），否则查询"""
+        items = getattr(order, 'created_items', None)
+        if items is None:
+            items = OrderSerializationService.load_items(order.id, archived=order.archived)
+        return items
+
+    @staticmethod
+    def to_dict(order, items=None):
+        """
+        订单数据（接口返回格式）
+        :param items: 已加载的明细，为 None 时按 items_of 获取
+        """
+        if items is None:
+            items = OrderSerializationService.items_of(order)
+        data = {column: getattr(order, column) for column in ORDER_COLUMNS}
+        data['created_at'] = order.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        data['items'] = [{column: getattr(item, column) for column in ORDER_ITEM_COLUMNS} for item in items]
+        return data
@@ -1,39 +1,199 @@
-from app.models import db, Order, OrderItem, Product
-from app.services.notification_service import NotificationService
+from sqlalchemy import insert, select, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from app.models import db, Order, OrderItem, OrderSequence, OrderIdempotencyKey, Product
+from app.services.archive_service import ArchiveService
+from app.services.catalog_service import CatalogService
+from app.services.outbox_service import OutboxService
+from app.services.order_search_service import OrderSearchService
+from app.services.order_serialization_service import OrderSerializationService
+from app.services.search_service import SearchService
 from datetime import datetime
-import random
-import string
+import os
+import threading
+from types import SimpleNamespace
+
+# 每次向数据库申请的订单序号数量
+ORDER_NO_BLOCK_SIZE = 100
+
+# 订单状态可以变更到的下一状态（批量变更时校验）
+ORDER_STATUS_TRANSITIONS = {
+    'pending': ('confirmed', 'cancelled'),
+    'confirmed': ('shipped', 'cancelled'),
+    'shipped': ('completed',),
+    'completed': (),
+    'cancelled': ()
+}
+
+
+class OrderNumberAllocator:
+    """订单序号分配器
+
+    每个进程在独立的短事务中从 order_sequences 表申请一块连续序号（原子 UPDATE），
+    块内序号在内存中递增分配。不同进程、不同主机拿到的块互不重叠，
+    不需要先查询再插入，平均每 ORDER_NO_BLOCK_SIZE 个订单才访问一次数据库。
+    进程重启时未用完的序号会跳过，订单号不保证连续。
+    """
+
+    def __init__(self, block_size=ORDER_NO_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._engine = None
+        self._day = None
+        self._next = 0
+        self._end = -1
+
+    def next_value(self, day):
+        """
+        分配一个序号
+        :param day: 日期字符串 yyyymmdd，序号按天重新开始
+        """
+        return self.next_values(day, 1)[0]
+
+    def next_values(self, day, count):
+        """
+        分配多个序号（批量下单用），当前块不够时一次申请足够的序号
+        :param day: 日期字符串 yyyymmdd，序号按天重新开始
+        :return: 序号列表（不一定连续）
+        """
+        with self._lock:
+            # fork 出的子进程（如 gunicorn --preload）不能沿用父进程申请的块，
+            # 同一进程中切换到其他数据库（如测试中多次 create_app）时也需重新申请
+            if self._pid != os.getpid() or self._engine is not db.engine or day != self._day:
+                self._next, self._end = 0, -1
+                self._day = day
+                self._pid = os.getpid()
+                self._engine = db.engine
+            values = list(range(self._next, min(self._next + count, self._end + 1)))
+            self._next += len(values)
+            if len(values) < count:
+                size = max(self.block_size, count - len(values))
+                self._end = self._reserve(day, size)
+                self._next = self._end - size + 1
+                remaining = count - len(values)
+                values.extend(range(self._next, self._next + remaining))
+                self._next += remaining
+            return values
+
+    def _reserve(self, day, size):
+        """
+        在独立事务中申请一块序号（不受调用方事务回滚影响）
+        :param size: 申请的序号数量
+        :return: 块内最大的序号
+        """
+        table = OrderSequence.__table__
+        while True:
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    table.update().where(table.c.day == day).values(
+                        last_value=table.c.last_value + size
+                    )
+                ).rowcount
+                if updated:
+                    # 同一事务内已持有该行的写锁，读到的就是本次更新后的值
+                    return conn.execute(select(table.c.last_value).where(table.c.day == day)).scalar()
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(table.insert().values(day=day, last_value=size))
+                return size
+            except IntegrityError:
+                # 其他进程同时创建了当天的序列，重新走 UPDATE
+                continue
+
+
+order_no_allocator = OrderNumberAllocator()
+
+
+class InsufficientStockError(ValueError):
+    """下单商品库存不足"""
+
+    def __init__(self, shortages):
+        """
+        :param shortages: 库存不足的商品列表 [{'product_id', 'product_name', 'requested', 'available'}]
+        """
+        self.shortages = shortages
+        if shortages:
+            message = '、'.join(
+                f"{item['product_name']} 库存不足（剩余 {item['available']}）" for item in shortages
+            )
+        else:
+            message = '商品库存不足'
+        super().__init__(message)
+
 
 class OrderService:
     
     @staticmethod
     def generate_order_no():
-        """生成订单号"""
+        """
+        生成订单号：ORD + 日期 + 当天序号（至少6位），跨进程、跨主机不会重复
+        需在本事务写入数据之前调用（SQLite 下申请序号需要获取写锁）
+        """
         date_str = datetime.now().strftime('%Y%m%d')
-        random_str = ''.join(random.choices(string.digits, k=4))
-        return f"ORD{date_str}{random_str}"
+        return f"ORD{date_str}{order_no_allocator.next_value(date_str):06d}"
     
     @staticmethod
-    def create_order(data):
-        """创建订单"""
-        from flask import g, request
-        
-        # 生成订单号
-        order_no = OrderService.generate_order_no()
-        
-        # 计算总金额和总数量
-        items = data.get('items', [])
+    def generate_order_nos(count):
+        """批量生成订单号（最多申请一次序号块），同样需在写入数据之前调用"""
+        date_str = datetime.now().strftime('%Y%m%d')
+        return [f"ORD{date_str}{value:06d}" for value in order_no_allocator.next_values(date_str, count)]
+    
+    @staticmethod
+    def _current_user_id():
+        """获取当前登录用户ID（未登录或不在请求上下文中时返回 None）"""
+        try:
+            from flask_login import current_user
+            if current_user and current_user.is_authenticated:
+                return current_user.id
+        except:
+            pass
+        return None
+    
+    @staticmethod
+    def _check_order_data(data):
+        """
+        检查订单数据的结构（客户姓名、商品列表、商品ID），在加载商品之前调用
+        批量下单时逐单检查，格式错误的订单只记为失败，不参与商品加载
+        :return: 商品列表，商品ID 统一为整数（兼容数字字符串）
+        """
+        if not isinstance(data, dict):
+            raise ValueError('订单格式不正确')
+        if not data.get('customer_name'):
+            raise ValueError('客户姓名不能为空')
+        items = data.get('items')
+        if not items:
+            raise ValueError('订单商品不能为空')
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            raise ValueError('订单商品格式不正确')
+        checked = []
+        for item in items:
+            product_id = item.get('product_id')
+            if isinstance(product_id, str) and product_id.strip().isdigit():
+                product_id = int(product_id)
+            if not isinstance(product_id, int) or isinstance(product_id, bool):
+                raise ValueError(f'商品ID {product_id!r} 格式不正确')
+            checked.append(dict(item, product_id=product_id))
+        return checked
+    
+    @staticmethod
+    def _price_items(items, products):
+        """
+        验证订单商品并计算价格
+        :param items: 订单商品 [{'product_id', 'quantity'}]
+        :param products: 已加载的商品 {id: Product}
+        :return: (order_items, total_amount, total_quantity)
+        """
         total_amount = 0
         total_quantity = 0
-        
-        # 验证商品并计算价格
         order_items = []
         for item in items:
-            product = Product.query.get(item['product_id'])
+            product = products.get(item.get('product_id'))
             if not product:
-                raise ValueError(f"商品ID {item['product_id']} 不存在")
+                raise ValueError(f"商品ID {item.get('product_id')} 不存在")
             
-            quantity = item['quantity']
+            quantity = item.get('quantity')
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                raise ValueError(f"商品 {product.name} 的数量必须是正整数")
             # 根据数量判断使用零售价还是批发价
             unit_price = product.wholesale_price if quantity >= product.wholesale_min_qty else product.retail_price
             subtotal = unit_price * quantity
@@ -47,15 +207,49 @@ class OrderService:
                 'unit_price': unit_price,
                 'subtotal': subtotal
             })
+        return order_items, total_amount, total_quantity
+    
+    @staticmethod
+    def _item_rows(order_id, order_items):
+        """订单明细的批量插入参数"""
+        return [{
+            'order_id': order_id,
+            'product_id': item_data['product'].id,
+            'product_name': item_data['product'].name,
+            'product_code': item_data['product'].product_code,
+            'quantity': item_data['quantity'],
+            'unit_price': item_data['unit_price'],
+            'subtotal': item_data['subtotal']
+        } for item_data in order_items]
+    
+    @staticmethod
+    def _stock_quantities(order_items, quantities=None):
+        """按商品汇总需要扣减的库存 {product_id: 数量}（传入 quantities 时累加到其中）"""
+        quantities = {} if quantities is None else quantities
+        for item_data in order_items:
+            product_id = item_data['product'].id
+            quantities[product_id] = quantities.get(product_id, 0) + item_data['quantity']
+        return quantities
+    
+    @staticmethod
+    def create_order(data, idempotency_key=None, request_hash=None):
+        """
+        创建订单
+        :param idempotency_key: 客户端幂等键，与订单在同一事务中保存；
+                                并发的重复请求提交时会因主键冲突抛出 IntegrityError
+        :param request_hash: 请求内容摘要（与幂等键一起保存）
+        """
+        items = OrderService._check_order_data(data)
         
-        # 获取当前用户ID（如果已登录）
-        user_id = None
-        try:
-            from flask_login import current_user
-            if current_user and current_user.is_authenticated:
-                user_id = current_user.id
-        except:
-            pass
+        # 生成订单号
+        order_no = OrderService.generate_order_no()
+        
+        # 一次查询加载订单涉及的全部商品
+        product_ids = list(dict.fromkeys(item['product_id'] for item in items))
+        products = {product.id: product for product in SearchService.load_products(product_ids)}
+        
+        # 验证商品并计算总金额和总数量
+        order_items, total_amount, total_quantity = OrderService._price_items(items, products)
         
         # 创建订单
         order = Order(
@@ -67,57 +261,308 @@ class OrderService:
             total_amount=total_amount,
             total_quantity=total_quantity,
             notes=data.get('notes'),
-            user_id=user_id
+            user_id=OrderService._current_user_id()
         )
         
         db.session.add(order)
         db.session.flush()  # 获取order.id
         
-        # 创建订单明细
-        for item_data in order_items:
-            item = OrderItem(
-                order_id=order.id,
-                product_id=item_data['product'].id,
-                product_name=item_data['product'].name,
-                product_code=item_data['product'].product_code,
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price'],
-                subtotal=item_data['subtotal']
-            )
-            db.session.add(item)
+        # 批量插入订单明细（一条 INSERT 语句）
+        item_rows = OrderService._item_rows(order.id, order_items)
+        if item_rows:
+            db.session.execute(insert(OrderItem), item_rows)
+        # 内存中的明细，返回订单数据时直接使用（见 OrderSerializationService.items_of）
+        order.created_items = [SimpleNamespace(**row) for row in item_rows]
         
-        db.session.commit()
+        # 订单搜索检索词
+        OrderSearchService.index_orders([order])
         
-        # 发送通知
-        try:
-            NotificationService.notify_new_order(order)
-        except Exception as e:
-            print(f"发送通知失败: {str(e)}")
+        # 通知写入发件箱，随订单一起提交，由后台任务发送
+        OutboxService.enqueue_order_notifications(order)
+        
+        if idempotency_key:
+            db.session.add(OrderIdempotencyKey(
+                key=idempotency_key, request_hash=request_hash, order_id=order.id
+            ))
+        
+        # 最后扣减库存，缩短商品行锁的持有时间（扣减到提交之间没有其他操作）
+        OrderService._reserve_stock(OrderService._stock_quantities(order_items))
+        
+        db.session.commit()
+        CatalogService.bump_stock_version()
+        OutboxService.check_backlog()
         
         return order
     
+    @staticmethod
+    def create_orders(orders_data):
+        """
+        批量创建订单（批发业务员一次同步多张订单）
+        全部订单的商品一次加载；校验通过的订单、明细、通知各用一条批量 INSERT 写入，
+        库存一次扣减，在同一事务中提交。校验失败或库存不足的订单不写入，不影响其他订单。
+        提交时其他请求已抢先扣减导致库存不足，则整批回滚并抛出 InsufficientStockError。
+        :param orders_data: 订单数据列表，每项格式同 create_order
+        :return: 按提交顺序的结果列表 [{'index', 'success', 'order'}] 或 [{'index', 'success', 'message'}]
+        """
+        # 先逐单检查格式，格式错误的订单记为失败，不影响其他订单
+        invalid = {}
+        checked_items = {}
+        for index, data in enumerate(orders_data):
+            try:
+                checked_items[index] = OrderService._check_order_data(data)
+            except ValueError as e:
+                invalid[index] = str(e)
+        
+        # 一次查询加载格式正确的订单涉及的商品
+        product_ids = list(dict.fromkeys(
+            item['product_id'] for items in checked_items.values() for item in items
+        ))
+        products = {product.id: product for product in SearchService.load_products(product_ids)}
+        
+        # 按提交顺序校验，并在内存中预分配库存，库存不足的订单直接拒绝
+        available = {product_id: product.stock or 0 for product_id, product in products.items()}
+        results = []
+        accepted = []
+        for index, data in enumerate(orders_data):
+            try:
+                if index in invalid:
+                    raise ValueError(invalid[index])
+                order_items, total_amount, total_quantity = OrderService._price_items(checked_items[index], products)
+                quantities = OrderService._stock_quantities(order_items)
+                shortages = [{
+                    'product_id': product_id,
+                    'product_name': products[product_id].name,
+                    'requested': quantity,
+                    'available': available[product_id]
+                } for product_id, quantity in quantities.items() if available[product_id] < quantity]
+                if shortages:
+                    raise InsufficientStockError(shortages)
+            except ValueError as e:
+                result = {'index': index, 'success': False, 'message': str(e)}
+                if isinstance(e, InsufficientStockError):
+                    result['shortages'] = e.shortages
+                results.append(result)
+                continue
+            
+            for product_id, quantity in quantities.items():
+                available[product_id] -= quantity
+            result = {'index': index, 'success': True}
+            results.append(result)
+            accepted.append((result, data, order_items, total_amount, total_quantity))
+        
+        if not accepted:
+            return results
+        
+        # 订单号需在写入数据之前生成
+        order_nos = OrderService.generate_order_nos(len(accepted))
+        user_id = OrderService._current_user_id()
+        now = datetime.utcnow()
+        
+        # 批量插入订单（多行 INSERT ... RETURNING），按订单号对应回 id：
+        # 要求按参数顺序返回时 SQLite 会退化为逐行插入
+        order_rows = [{
+            'order_no': order_no,
+            'customer_name': data.get('customer_name'),
+            'customer_phone': data.get('customer_phone'),
+            'customer_email': data.get('customer_email'),
+            'customer_address': data.get('customer_address'),
+            'total_amount': total_amount,
+            'total_quantity': total_quantity,
+            'notes': data.get('notes'),
+            'user_id': user_id,
+            'created_at': now,
+            'updated_at': now
+        } for order_no, (_, data, _, total_amount, total_quantity) in zip(order_nos, accepted)]
+        inserted = db.session.execute(insert(Order).returning(Order.id, Order.order_no), order_rows)
+        ids_by_no = {row.order_no: row.id for row in inserted}
+        order_ids = [ids_by_no[order_no] for order_no in order_nos]
+        
+        # 所有订单的明细一条批量 INSERT
+        # 内存中的订单和明细，索引检索词、返回订单数据时直接使用，不再回查数据库
+        orders = [SimpleNamespace(id=order_id, status='pending', **row) for order_id, row in zip(order_ids, order_rows)]
+        order_item_rows = []
+        quantities = {}
+        for order_id, (_, _, order_items, _, _) in zip(order_ids, accepted):
+            order_item_rows.append(OrderService._item_rows(order_id, order_items))
+            OrderService._stock_quantities(order_items, quantities)
+        db.session.execute(insert(OrderItem), [row for rows in order_item_rows for row in rows])
+        
+        OrderSearchService.index_orders(orders)
+        OutboxService.enqueue_orders_notifications(order_ids)
+        
+        OrderService._reserve_stock(quantities)
+        
+        db.session.commit()
+        CatalogService.bump_stock_version()
+        OutboxService.check_backlog()
+        
+        # 与 POST /api/orders 等接口返回相同格式的订单数据
+        for order, rows, (result, _, _, _, _) in zip(orders, order_item_rows, accepted):
+            result['order'] = OrderSerializationService.to_dict(order, [SimpleNamespace(**row) for row in rows])
+        return results
+    
+    @staticmethod
+    def _reserve_stock(quantities):
+        """
+        扣减订单商品库存（在当前事务中，随订单一起提交）
+        :param quantities: 各商品扣减数量 {product_id: 数量}，见 _stock_quantities
+        每个商品一条条件 UPDATE（stock >= 数量 才扣减），整单一次 executemany 发送，
+        不需要先 SELECT ... FOR UPDATE 读库存，并发下单不会超卖。
+        按商品 id 顺序更新，多个订单同时扣减相同商品时加锁顺序一致，不会死锁。
+        提交后由调用方递增库存版本号（CatalogService.bump_stock_version），搜索结果缓存、ETag 和目录快照随之失效。
+        库存不足时回滚整个事务并抛出 InsufficientStockError。
+        """
+        if not quantities:
+            return
+        
+        table = Product.__table__
+        stmt = table.update().where(
+            table.c.id == bindparam('product_id'),
+            table.c.stock >= bindparam('quantity')
+        ).values(
+            stock=table.c.stock - bindparam('quantity'),
+            # 更新时间用于商品详情的缓存校验和增量同步
+            updated_at=datetime.utcnow()
+        )
+        result = db.session.execute(stmt, [
+            {'product_id': product_id, 'quantity': quantity}
+            for product_id, quantity in sorted(quantities.items())
+        ])
+        if result.rowcount == len(quantities):
+            return
+        
+        # 有商品库存不足：回滚后读取当前库存用于提示
+        db.session.rollback()
+        rows = db.session.query(Product.id, Product.name, Product.stock).filter(
+            Product.id.in_(quantities)
+        ).order_by(Product.id).all()
+        shortages = [{
+            'product_id': row.id,
+            'product_name': row.name,
+            'requested': quantities[row.id],
+            'available': row.stock or 0
+        } for row in rows if (row.stock or 0) < quantities[row.id]]
+        raise InsufficientStockError(shortages)
+    
+    @staticmethod
+    def _order_quantities(order_ids):
+        """订单明细按商品汇总的数量 {product_id: 数量}（一次分组查询）"""
+        if not order_ids:
+            return {}
+        return dict(db.session.query(
+            OrderItem.product_id, db.func.sum(OrderItem.quantity)
+        ).filter(OrderItem.order_id.in_(order_ids)).group_by(OrderItem.product_id).all())
+    
+    @staticmethod
+    def _release_stock(quantities):
+        """
+        归还已取消订单扣减的库存（在当前事务中，随状态变更一起提交）
+        :param quantities: 各商品归还数量 {product_id: 数量}，见 _order_quantities
+        与 _reserve_stock 相同，整批一次 executemany，按商品 id 顺序加锁
+        """
+        if not quantities:
+            return
+        
+        table = Product.__table__
+        stmt = table.update().where(
+            table.c.id == bindparam('product_id')
+        ).values(
+            stock=table.c.stock + bindparam('quantity'),
+            updated_at=datetime.utcnow()
+        )
+        db.session.execute(stmt, [
+            {'product_id': product_id, 'quantity': quantity}
+            for product_id, quantity in sorted(quantities.items())
+        ])
+    
     @staticmethod
     def update_order_status(order_id, status):
-        """更新订单状态"""
+        """
+        更新订单状态
+        取消订单时归还库存，已取消的订单恢复为其他状态时重新扣减库存（库存不足抛出 InsufficientStockError）。
+        按原状态做条件 UPDATE，同一订单被并发操作时库存只归还/扣减一次。
+        """
         order = Order.query.get_or_404(order_id)
-        order.status = status
-        order.updated_at = datetime.utcnow()
+        previous = order.status
+        changed = Order.query.filter(
+            Order.id == order_id,
+            Order.status == previous
+        ).update({
+            Order.status: status,
+            Order.updated_at: datetime.utcnow()
+        })
+        stock_changed = changed and previous != status and 'cancelled' in (status, previous)
+        if stock_changed:
+            if status == 'cancelled':
+                OrderService._release_stock(OrderService._order_quantities([order_id]))
+            else:
+                OrderService._reserve_stock(OrderService._order_quantities([order_id]))
         db.session.commit()
+        if stock_changed:
+            CatalogService.bump_stock_version()
         return order
     
+    @staticmethod
+    def bulk_update_status(order_ids, status):
+        """
+        批量更新订单状态：一条 UPDATE，只变更当前状态允许转到目标状态的订单
+        （见 ORDER_STATUS_TRANSITIONS），其余订单保持不变。
+        批量取消时在同一事务中归还实际被取消的订单扣减的库存。
+        :param order_ids: 订单 id 列表
+        :param status: 目标状态
+        :return: 实际变更的订单数
+        """
+        if status not in ORDER_STATUS_TRANSITIONS:
+            raise ValueError(f'无效的订单状态: {status}')
+        sources = [source for source, targets in ORDER_STATUS_TRANSITIONS.items() if status in targets]
+        if not order_ids or not sources:
+            return 0
+        
+        # RETURNING 取回实际变更的订单，并发取消同一订单时只有一方能取回
+        updated_ids = db.session.execute(
+            update(Order).where(
+                Order.id.in_(order_ids),
+                Order.status.in_(sources)
+            ).values(
+                status=status,
+                updated_at=datetime.utcnow()
+            ).returning(Order.id),
+            execution_options={'synchronize_session': False}
+        ).scalars().all()
+        if status == 'cancelled':
+            OrderService._release_stock(OrderService._order_quantities(updated_ids))
+        db.session.commit()
+        if status == 'cancelled' and updated_ids:
+            CatalogService.bump_stock_version()
+        return len(updated_ids)
+    
     @staticmethod
     def get_order_statistics():
-        """获取订单统计信息"""
-        total_orders = Order.query.count()
-        pending_orders = Order.query.filter_by(status='pending').count()
-        confirmed_orders = Order.query.filter_by(status='confirmed').count()
-        completed_orders = Order.query.filter_by(status='completed').count()
-        cancelled_orders = Order.query.filter_by(status='cancelled').count()
+        """获取订单统计信息（包括已归档的订单，按状态分组一次查询）"""
+        orders = ArchiveService.order_rows()
+        by_status = {
+            row.status: row
+            for row in db.session.query(
+                orders.c.status,
+                db.func.count(orders.c.id).label('count'),
+                db.func.sum(orders.c.total_amount).label('total_amount')
+            ).group_by(orders.c.status)
+        }
+        
+        def count(status):
+            return by_status[status].count if status in by_status else 0
+        
+        total_orders = sum(row.count for row in by_status.values())
+        pending_orders = count('pending')
+        confirmed_orders = count('confirmed')
+        completed_orders = count('completed')
+        cancelled_orders = count('cancelled')
         
         # 计算总销售额
-        total_sales = db.session.query(db.func.sum(Order.total_amount)).filter(
-            Order.status.in_(['confirmed', 'shipped', 'completed'])
-        ).scalar() or 0
+        total_sales = sum(
+            by_status[status].total_amount or 0
+            for status in ('confirmed', 'shipped', 'completed') if status in by_status
+        )
         
         return {
             'total_orders': total_orders,
@@ -0,0 +1,189 @@
+"""
+通知发件箱服务
+下单时在同一事务中写入待发送的通知，由后台线程或独立进程投递，
+失败按退避时间重试，结账请求不再等待邮件服务器和短信接口。
+多个 worker 同时投递时通过条件 UPDATE 认领，同一条通知只会被一个进程发送。
+没有任何进程在投递时（如只启动了 Web 进程又关闭了投递线程），下单时会记录告警日志。
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert, or_, func
+from app.models import db, Order, NotificationOutbox
+from app.services.notification_service import NotificationService
+
+
+# 每个订单需要投递的渠道
+OUTBOX_CHANNELS = ('email', 'sms')
+# 最多尝试次数，超过后标记为 failed
+MAX_ATTEMPTS = 8
+# 重试退避：60 秒起按 2 的幂增长，最长 1 小时
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+# 认领租期：投递进程崩溃时，超过租期的通知可被重新认领
+CLAIM_LEASE = timedelta(minutes=5)
+# 每轮最多投递的条数
+DELIVERY_BATCH_SIZE = 20
+# 到期超过该时长仍未投递的通知视为积压（没有进程在投递）
+BACKLOG_WARN_AFTER = timedelta(minutes=10)
+# 每个进程检查积压的最短间隔
+BACKLOG_CHECK_INTERVAL = timedelta(minutes=1)
+
+
+class OutboxService:
+
+    # 本进程上次检查积压的时间，见 check_backlog
+    _backlog_checked_at = None
+
+    @staticmethod
+    def enqueue_order_notifications(order):
+        """
+        为新订单写入待发送的通知（不提交，随订单一起提交）
+        :param order: 已 flush、有 id 的订单
+        """
+        for channel in OUTBOX_CHANNELS:
+            db.session.add(NotificationOutbox(order_id=order.id, channel=channel))
+
+    @staticmethod
+    def enqueue_orders_notifications(order_ids):
+        """
+        为一批新订单写入待发送的通知（一条批量 INSERT，不提交）
+        :param order_ids: 已插入的订单 id 列表
+        """
+        if order_ids:
+            db.session.execute(insert(NotificationOutbox), [
+                {'order_id': order_id, 'channel': channel}
+                for order_id in order_ids for channel in OUTBOX_CHANNELS
+            ])
+
+    @staticmethod
+    def check_backlog():
+        """
+        积压的通知超过 BACKLOG_WARN_AFTER 时记录告警日志（每个进程最多每 BACKLOG_CHECK_INTERVAL 检查一次）
+        :return: 积压的条数（本次未检查时返回 None）
+        """
+        now = datetime.utcnow()
+        checked_at = OutboxService._backlog_checked_at
+        if checked_at is not None and now - checked_at < BACKLOG_CHECK_INTERVAL:
+            return None
+        OutboxService._backlog_checked_at = now
+
+        count, oldest = db.session.query(
+            func.count(NotificationOutbox.id), func.min(NotificationOutbox.next_attempt_at)
+        ).filter(
+            NotificationOutbox.status == 'pending',
+            NotificationOutbox.next_attempt_at < now - BACKLOG_WARN_AFTER
+        ).one()
+        if count:
+            current_app.logger.warning(
+                f'[通知发件箱] {count} 条通知积压未投递（最早应于 {oldest:%Y-%m-%d %H:%M:%S} UTC 发送），'
+                f'请确认已运行 scripts/notification_worker.py 或启用了 NOTIFICATION_WORKER_THREAD'
+            )
+        return count
+
+    @staticmethod
+    def _claimable(now):
+        return db.and_(
+            NotificationOutbox.status == 'pending',
+            NotificationOutbox.next_attempt_at <= now,
+            or_(NotificationOutbox.locked_until.is_(None), NotificationOutbox.locked_until < now)
+        )
+
+    @staticmethod
+    def _claim(message_id, now):
+        """认领一条通知，返回是否认领成功（已被其他进程认领时返回 False）"""
+        claimed = NotificationOutbox.query.filter(
+            NotificationOutbox.id == message_id, OutboxService._claimable(now)
+        ).update({NotificationOutbox.locked_until: now + CLAIM_LEASE}, synchronize_session=False)
+        db.session.commit()
+        return claimed == 1
+
+    @staticmethod
+    def deliver_pending(limit=DELIVERY_BATCH_SIZE):
+        """
+        投递到期的待发送通知
+        :return: 本轮处理的条数
+        """
+        now = datetime.utcnow()
+        message_ids = [row.id for row in db.session.query(NotificationOutbox.id).filter(
+            OutboxService._claimable(now)
+        ).order_by(NotificationOutbox.id).limit(limit)]
+        db.session.commit()
+
+        processed = 0
+        for message_id in message_ids:
+            if OutboxService._claim(message_id, now):
+                OutboxService._deliver(db.session.get(NotificationOutbox, message_id))
+                processed += 1
+        return processed
+
+    @staticmethod
+    def _deliver(message):
+        """发送一条通知并记录结果"""
+        now = datetime.utcnow()
+        order = db.session.get(Order, message.order_id)
+        if order is None or not NotificationService.channel_enabled(message.channel):
+            # 渠道未启用（或订单已删除）时不再重试
+            message.status = 'skipped'
+        else:
+            send = {
+                'email': NotificationService.send_email_notification,
+                'sms': NotificationService.send_sms_notification
+            }[message.channel]
+            try:
+                success = send(order)
+                error = None if success else '发送失败'
+            except Exception as e:
+                success, error = False, str(e)
+
+            message.attempts = (message.attempts or 0) + 1
+            if success:
+                message.status = 'sent'
+                message.sent_at = now
+                # 至少一个渠道发送成功即视为已通知
+                order.notified = True
+            else:
+                message.last_error = error
+                if message.attempts >= MAX_ATTEMPTS:
+                    message.status = 'failed'
+                else:
+                    delay = min(RETRY_BASE_SECONDS * 2 ** (message.attempts - 1), RETRY_MAX_SECONDS)
+                    message.next_attempt_at = now + timedelta(seconds=delay)
+
+        message.locked_until = None
+        db.session.commit()
+
+    @staticmethod
+    def run_worker(app, interval=5, stop_event=None):
+        """
+        循环投递通知，直到 stop_event 被设置
+        :param interval: 没有待发送通知时的轮询间隔（秒）
+        """
+        while stop_event is None or not stop_event.is_set():
+            processed = 0
+            with app.app_context():
+                try:
+                    processed = OutboxService.deliver_pending()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"[通知发件箱] 投递失败: {str(e)}")
+                finally:
+                    db.session.remove()
+            # 本轮处理满一批时立即继续，否则等待
+            if processed < DELIVERY_BATCH_SIZE:
+                if stop_event is not None:
+                    stop_event.wait(interval)
+                else:
+                    time.sleep(interval)
+
+    @staticmethod
+    def start_worker_thread(app, interval=5):
+        """在当前进程中启动后台投递线程（守护线程）"""
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=OutboxService.run_worker, args=(app, interval, stop_event),
+            name='notification-outbox', daemon=True
+        )
+        thread.start()
+        return stop_event
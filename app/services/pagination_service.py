@@ -0,0 +1,88 @@
+"""
+游标分页服务
+按 (created_at, id) 倒序做 keyset 分页，替代 OFFSET/LIMIT + COUNT(*)，
+翻到再深的页也只是一次索引范围扫描
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+class CursorPage:
+    """一页游标分页结果"""
+
+    def __init__(self, items, next_cursor=None, total=None, facets=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.has_more = next_cursor is not None
+        self.total = total
+        self.facets = facets  # 各分类命中数 {分类id: 数量}，未统计时为 None
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class PaginationService:
+
+    @staticmethod
+    def encode_cursor(created_at, item_id, rank=None):
+        """
+        把排序键编码成不透明的游标字符串
+        :param rank: 相关度得分，按相关度排序时使用
+        """
+        raw = f"{created_at.isoformat() if created_at else ''}|{item_id}"
+        if rank is not None:
+            raw = f"{rank}|{raw}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        解析游标
+        :return: (created_at, id, rank)，不含相关度时 rank 为 None；空游标返回 None
+        :raises ValueError: 游标格式错误
+        """
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+            parts = raw.split('|')
+            rank = int(parts.pop(0)) if len(parts) == 3 else None
+            created_str, item_id = parts
+            created_at = datetime.fromisoformat(created_str) if created_str else None
+            return created_at, int(item_id), rank
+        except Exception:
+            raise ValueError('无效的分页游标')
+
+    @staticmethod
+    def keyset_paginate(query, model, cursor=None, per_page=20, with_total=False):
+        """
+        对查询做 keyset 分页（按 created_at、id 倒序）
+        :param query: 已带筛选条件的查询
+        :param model: 模型类，需有 created_at 和 id 字段
+        :param cursor: 上一页返回的 next_cursor，None 表示第一页
+        :param per_page: 每页数量
+        :param with_total: 是否额外统计总数（需要 COUNT，默认不统计）
+        :return: CursorPage
+        """
+        total = query.order_by(None).count() if with_total else None
+
+        position = PaginationService.decode_cursor(cursor)
+        if position:
+            created_at, item_id, _ = position
+            query = query.filter(or_(
+                model.created_at < created_at,
+                and_(model.created_at == created_at, model.id < item_id)
+            ))
+
+        # 多取一条判断是否还有下一页
+        rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+        items = rows[:per_page]
+
+        next_cursor = None
+        if len(rows) > per_page:
+            last = items[-1]
+            next_cursor = PaginationService.encode_cursor(last.created_at, last.id)
+
+        return CursorPage(items, next_cursor=next_cursor, total=total)
@@ -1,4 +1,7 @@
-from app.models import db, Product, ProductImage, Category
+from app.models import db, Product, ProductImage, ProductSearchKey, ProductTombstone, Category
+from app.services.catalog_service import CatalogService
+from app.services.search_service import SearchService, pinyin_keys
+from sqlalchemy import insert, select
 from flask import current_app, request
 import os
 import requests
@@ -69,6 +72,88 @@ class ProductService:
             print(f"下载图片失败: {str(e)}")
         return None
     
+    @staticmethod
+    def touch_products(product_ids):
+        """
+        更新产品的修改时间（不提交）
+        图片的增删改不会改动产品行，按 updated_at 缓存的数据需要借此失效
+        """
+        if product_ids:
+            Product.query.filter(Product.id.in_(product_ids)).update(
+                {Product.updated_at: datetime.utcnow()}, synchronize_session=False
+            )
+    
+    @staticmethod
+    def get_images_map(product_ids):
+        """
+        一次查询批量获取多个产品的图片，避免逐个产品查询
+        :param product_ids: 产品id列表
+        :return: {产品id: [ProductImage, ...]}，按排序字段排列
+        """
+        images_map = {product_id: [] for product_id in product_ids}
+        if not product_ids:
+            return images_map
+        images = ProductImage.query.filter(
+            ProductImage.product_id.in_(product_ids)
+        ).order_by(ProductImage.product_id, ProductImage.sort_order, ProductImage.id).all()
+        for image in images:
+            images_map[image.product_id].append(image)
+        return images_map
+    
+    @staticmethod
+    def get_image_urls_map(product_ids):
+        """批量获取产品图片地址 {产品id: [图片地址, ...]}"""
+        return {
+            product_id: [image.image_url for image in images]
+            for product_id, images in ProductService.get_images_map(product_ids).items()
+        }
+    
+    @staticmethod
+    def get_primary_image_map(product_ids):
+        """批量获取产品主图地址 {产品id: 主图地址或None}，未设置主图时取第一张"""
+        primary_map = {}
+        for product_id, images in ProductService.get_images_map(product_ids).items():
+            primary = next((image for image in images if image.is_primary), None)
+            if primary is None and images:
+                primary = images[0]
+            primary_map[product_id] = primary.image_url if primary else None
+        return primary_map
+    
+    @staticmethod
+    def update_search_key(product):
+        """预计算产品名称的全拼和首字母，随产品一起保存"""
+        full, initials = pinyin_keys(product.name)
+        if product.search_key is None:
+            product.search_key = ProductSearchKey(name_pinyin=full, name_initials=initials)
+        else:
+            product.search_key.name_pinyin = full
+            product.search_key.name_initials = initials
+    
+    @staticmethod
+    def backfill_search_keys(batch_size=1000):
+        """
+        为还没有拼音检索键的产品（升级前的产品、脚本直接插入的产品）生成检索键
+        每批一条批量 INSERT 并提交；检索键与构建索引时现算的结果相同，不需要递增目录版本号
+        :return: 补齐的产品数
+        """
+        has_key = select(ProductSearchKey.product_id).where(ProductSearchKey.product_id == Product.id).exists()
+        count = 0
+        after_id = 0
+        while True:
+            rows = db.session.query(Product.id, Product.name).filter(
+                Product.id > after_id, ~has_key
+            ).order_by(Product.id).limit(batch_size).all()
+            if not rows:
+                return count
+            keys = []
+            for row in rows:
+                full, initials = pinyin_keys(row.name)
+                keys.append({'product_id': row.id, 'name_pinyin': full, 'name_initials': initials})
+            db.session.execute(insert(ProductSearchKey), keys)
+            db.session.commit()
+            count += len(rows)
+            after_id = rows[-1].id
+    
     @staticmethod
     def create_product(data):
         """创建产品"""
@@ -86,8 +171,11 @@ class ProductService:
             description=data.get('description'),
             category_id=data.get('category_id')
         )
+        ProductService.update_search_key(product)
         db.session.add(product)
+        CatalogService.bump_version()
         db.session.commit()
+        SearchService.index_product(product)
         return product
     
     @staticmethod
@@ -108,8 +196,11 @@ class ProductService:
         product.description = data.get('description', product.description)
         product.category_id = data.get('category_id', product.category_id)
         product.updated_at = datetime.utcnow()
+        ProductService.update_search_key(product)
         
+        CatalogService.bump_version()
         db.session.commit()
+        SearchService.index_product(product)
         return product
     
     @staticmethod
@@ -126,18 +217,17 @@ class ProductService:
             except:
                 pass
         db.session.delete(product)
+        # 记录删除，离线终端增量同步时据此删除本地产品
+        db.session.add(ProductTombstone(product_id=product.id, product_code=product.product_code))
+        CatalogService.bump_version()
         db.session.commit()
+        SearchService.remove_product(product_id)
         return True
     
     @staticmethod
     def search_products(query):
         """搜索产品"""
-        return Product.query.filter(
-            (Product.name.contains(query)) |
-            (Product.product_code.contains(query)) |
-            (Product.barcode.contains(query)) |
-            (Product.model.contains(query))
-        ).filter_by(status='active').all()
+        return SearchService.search_products(query)
     
     @staticmethod
     def import_products_from_excel(file):
@@ -150,6 +240,7 @@ class ProductService:
         success_count = 0
         error_count = 0
         errors = []
+        imported_products = []
         
         for index, row in df.iterrows():
             try:
@@ -180,14 +271,20 @@ class ProductService:
                     description=str(row.get('描述', '')) if pd.notna(row.get('描述')) else ''
                 )
                 
+                ProductService.update_search_key(product)
                 db.session.add(product)
+                imported_products.append(product)
                 success_count += 1
                 
             except Exception as e:
                 errors.append(f"第{index+2}行: {str(e)}")
                 error_count += 1
         
+        db.session.flush()
+        imported_ids = [product.id for product in imported_products]
+        CatalogService.bump_version()
         db.session.commit()
+        SearchService.refresh_products(imported_ids)
         
         return {
             'success_count': success_count,
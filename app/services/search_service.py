@@ -0,0 +1,677 @@
+"""
+产品搜索服务
+在进程内维护货号、条码、产品名称、型号的字符 n-gram 倒排索引，
+替代 LIKE '%q%' 的四列全表扫描（中文名称没有空格，不能按词切分）
+"""
+import math
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+from sqlalchemy.orm import load_only
+from flask_sqlalchemy.pagination import Pagination
+from pypinyin import lazy_pinyin, Style
+from app.models import db, Product, ProductSearchKey, ProductTombstone
+from app.services.catalog_service import CatalogService
+from app.services.pagination_service import PaginationService, CursorPage
+
+
+# 建立索引的字段
+INDEXED_FIELDS = ('product_code', 'barcode', 'name', 'model')
+
+# 字段之间的分隔符，保证 n-gram 不会跨字段
+FIELD_SEPARATOR = '\x1f'
+
+# 可精确查找的编码字段（货号、条码），位于检索文本的前两段
+CODE_FIELD_COUNT = 2
+
+# 可按拼音前缀匹配的查询（纯字母）
+PINYIN_QUERY = re.compile(r'^[a-z]+$')
+
+# 相关度排序的分档得分
+SCORE_EXACT = 100  # 货号或条码与关键词完全相同
+SCORE_PREFIX = 75  # 任一字段或名称拼音以关键词开头
+SCORE_SUBSTRING = 50  # 任一字段包含关键词
+SCORE_FUZZY = 25  # 名称或型号与关键词共享大部分三元组（容错输入）
+
+# 输入联想单次最多扫描的前缀条目数
+SUGGEST_SCAN_LIMIT = 200
+
+# 输入联想允许使用的索引最大陈旧秒数，期间不访问数据库
+SUGGEST_MAX_STALENESS = 5
+
+# 容错匹配要求共享的三元组比例（只比较名称和型号，编码之间的三元组大多相同）
+FUZZY_MIN_OVERLAP = 0.6
+
+# 增量同步时向前多取的时间窗口，覆盖提交顺序与 updated_at 顺序不一致的事务
+SYNC_OVERLAP = timedelta(minutes=1)
+
+# 单次 IN 查询的最大 id 数量（SQLite 默认变量上限为 999）
+LOAD_CHUNK_SIZE = 500
+
+
+def normalize(value):
+    """统一大小写和首尾空白"""
+    return str(value).strip().lower() if value else ''
+
+
+def pinyin_keys(name):
+    """
+    计算产品名称的全拼和首字母，如 毛巾 -> ('maojin', 'mj')
+    非汉字部分保留字母数字
+    """
+    if not name:
+        return '', ''
+    full = ''.join(lazy_pinyin(name))
+    initials = ''.join(lazy_pinyin(name, style=Style.FIRST_LETTER))
+    return re.sub(r'[^a-z0-9]', '', full.lower()), re.sub(r'[^a-z0-9]', '', initials.lower())
+
+
+def ngrams(text, n):
+    """切分字符 n-gram（不跨字段）"""
+    grams = set()
+    for part in text.split(FIELD_SEPARATOR):
+        for i in range(len(part) - n + 1):
+            grams.add(part[i:i + n])
+    return grams
+
+
+class ProductSearchIndex:
+    """字符二元/三元组倒排索引
+
+    每个产品保存一份规范化后的检索文本，以及状态、分类和排序键，
+    这样筛选、排序、分页都在内存中完成，数据库只需按 id 取当前页。
+    名称、货号、条码及名称的全拼和首字母另存于有序数组，按前缀二分查找（拼音搜索、输入联想）。
+    """
+
+    GRAM_SIZES = (2, 3)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs = {}  # product_id -> (text, status, category_id, sort_key, prefix_keys, (name, product_code))
+        self._postings = {n: {} for n in self.GRAM_SIZES}  # n -> {gram: set(product_id)}
+        self._codes = {}  # 规范化的货号/条码 -> set(product_id)
+        self._prefixes = []  # 有序数组 [(前缀键, product_id)]
+        self._category_counts = Counter()  # (status, category_id) -> 产品数量
+        self.built = False
+        self.version = None  # 索引对应的目录版本号
+        self.synced_at = None  # 已同步到的最大 updated_at
+        self.tombstone_id = 0  # 已处理到的产品删除记录 id（ProductTombstone）
+        self.warm_up_thread = None  # 启动时构建索引的后台线程
+        self.checked_at = 0  # 上次核对目录版本号的时间（time.monotonic）
+
+    @staticmethod
+    def make_doc(row):
+        """由产品对象或查询行构建索引文档"""
+        text = FIELD_SEPARATOR.join(normalize(getattr(row, field)) for field in INDEXED_FIELDS)
+        created_ts = row.created_at.timestamp() if row.created_at else 0
+
+        # 前缀键：名称、货号、条码，以及名称的全拼和首字母
+        # 拼音优先使用保存时预计算的值，旧数据没有时现算
+        search_key = getattr(row, 'search_key', None)
+        if search_key is not None:
+            full, initials = search_key.name_pinyin, search_key.name_initials
+        else:
+            full, initials = getattr(row, 'name_pinyin', None), getattr(row, 'name_initials', None)
+        if full is None and initials is None:
+            full, initials = pinyin_keys(row.name)
+        fields = text.split(FIELD_SEPARATOR)
+        keys = tuple(sorted({key for key in (fields[0], fields[1], fields[2], full, initials) if key}))
+
+        return text, row.status, row.category_id, (created_ts, row.id), keys, (row.name, row.product_code)
+
+    def build(self, rows, version=None, tombstone_id=0):
+        """
+        全量重建索引
+        :param tombstone_id: 读取 rows 之前最大的产品删除记录 id，之后的删除由 sync 处理
+        """
+        with self._lock:
+            self._docs = {}
+            self._postings = {n: {} for n in self.GRAM_SIZES}
+            self._codes = {}
+            self._prefixes = []
+            self._category_counts = Counter()
+            self.synced_at = None
+            for row in rows:
+                self._add(row.id, self.make_doc(row), sort_prefixes=False)
+                self._track_updated_at(row)
+            self._prefixes.sort()
+            self.version = version
+            self.tombstone_id = tombstone_id
+            self.built = True
+
+    def sync(self, rows, version, removed=(), tombstone_id=None):
+        """
+        增量同步其他进程写入的产品
+        :param removed: 已删除的产品 id（先移除再写入 rows，id 被新产品复用时也正确）
+        :param tombstone_id: 已处理到的产品删除记录 id
+        """
+        with self._lock:
+            for product_id in removed:
+                self._remove(product_id)
+            for row in rows:
+                self.upsert(row.id, self.make_doc(row))
+                self._track_updated_at(row)
+            if tombstone_id is not None:
+                self.tombstone_id = tombstone_id
+            self.version = version
+
+    def _track_updated_at(self, row):
+        updated_at = getattr(row, 'updated_at', None)
+        if updated_at and (self.synced_at is None or updated_at > self.synced_at):
+            self.synced_at = updated_at
+
+    def __len__(self):
+        return len(self._docs)
+
+    def upsert(self, product_id, doc):
+        """新增或更新单个产品"""
+        with self._lock:
+            self._remove(product_id)
+            self._add(product_id, doc)
+
+    def remove(self, product_id):
+        """移除单个产品"""
+        with self._lock:
+            self._remove(product_id)
+
+    def _add(self, product_id, doc, sort_prefixes=True):
+        self._docs[product_id] = doc
+        self._category_counts[(doc[1], doc[2])] += 1
+        for key in doc[4]:
+            if sort_prefixes:
+                insort(self._prefixes, (key, product_id))
+            else:
+                self._prefixes.append((key, product_id))
+        for n in self.GRAM_SIZES:
+            postings = self._postings[n]
+            for gram in ngrams(doc[0], n):
+                postings.setdefault(gram, set()).add(product_id)
+        for code in doc[0].split(FIELD_SEPARATOR)[:CODE_FIELD_COUNT]:
+            if code:
+                self._codes.setdefault(code, set()).add(product_id)
+
+    def _remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        self._category_counts[(doc[1], doc[2])] -= 1
+        if not self._category_counts[(doc[1], doc[2])]:
+            del self._category_counts[(doc[1], doc[2])]
+        for key in doc[4]:
+            i = bisect_left(self._prefixes, (key, product_id))
+            if i < len(self._prefixes) and self._prefixes[i] == (key, product_id):
+                del self._prefixes[i]
+        for n in self.GRAM_SIZES:
+            postings = self._postings[n]
+            for gram in ngrams(doc[0], n):
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(product_id)
+                    if not ids:
+                        del postings[gram]
+        for code in doc[0].split(FIELD_SEPARATOR)[:CODE_FIELD_COUNT]:
+            ids = self._codes.get(code)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._codes[code]
+
+    def _candidates(self, query):
+        """通过倒排表求候选集合，单字符查询退化为内存扫描"""
+        if len(query) < 2:
+            return self._docs.keys()
+
+        n = 3 if len(query) >= 3 else 2
+        postings = self._postings[n]
+        lists = []
+        for gram in ngrams(query, n):
+            ids = postings.get(gram)
+            if not ids:
+                return set()
+            lists.append(ids)
+
+        # 从最短的倒排表开始求交集
+        lists.sort(key=len)
+        result = set(lists[0])
+        for ids in lists[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+    def _prefix_ids(self, query):
+        """按前缀（含拼音）查找产品 id"""
+        ids = set()
+        i = bisect_left(self._prefixes, (query,))
+        while i < len(self._prefixes) and self._prefixes[i][0].startswith(query):
+            ids.add(self._prefixes[i][1])
+            i += 1
+        return ids
+
+    def _fuzzy_candidates(self, query):
+        """
+        容错匹配：名称或型号与关键词共享大部分三元组的产品（如输错一个字）
+        货号、条码不参与：数字编码之间共享大部分三元组，扫码查询会命中几乎全部产品
+        """
+        grams = ngrams(query, 3)
+        if len(grams) < 2:
+            return set()
+        counts = Counter()
+        postings = self._postings[3]
+        for gram in grams:
+            counts.update(postings.get(gram, ()))
+        min_count = math.ceil(len(grams) * FUZZY_MIN_OVERLAP)
+        result = set()
+        for product_id, count in counts.items():
+            if count < min_count:
+                continue
+            # 倒排表不区分字段，只按名称和型号的三元组重新计算
+            name_fields = FIELD_SEPARATOR.join(self._docs[product_id][0].split(FIELD_SEPARATOR)[CODE_FIELD_COUNT:])
+            if len(grams & ngrams(name_fields, 3)) >= min_count:
+                result.add(product_id)
+        return result
+
+    def _score(self, query, text, matched_pinyin):
+        """相关度分档：完全匹配编码 > 前缀 > 子串 > 容错"""
+        fields = text.split(FIELD_SEPARATOR)
+        if query in fields[:CODE_FIELD_COUNT]:
+            return SCORE_EXACT
+        if matched_pinyin or any(field.startswith(query) for field in fields):
+            return SCORE_PREFIX
+        if query in text:
+            return SCORE_SUBSTRING
+        return SCORE_FUZZY
+
+    def search(self, query, category_id=None, status='active', before=None, sort='newest', with_keys=False,
+               facets=False):
+        """
+        搜索产品
+        :param query: 关键词（匹配货号、条码、名称、型号的任意子串，或名称的全拼/首字母前缀）
+        :param category_id: 分类筛选
+        :param status: 状态筛选，None 表示不限
+        :param before: 游标位置（排序键），只返回排在其后的产品
+        :param sort: newest 按创建时间倒序；relevance 按相关度分档，同档内按创建时间倒序，
+                     精确、前缀、子串都没有命中时改用容错匹配（只匹配名称和型号）
+        :param with_keys: 是否返回排序键而不是 id
+        :param facets: 是否同时统计各分类的命中数（不受 category_id 和 before 限制）
+        :return: 产品 id 列表；with_keys 时返回排序键列表，
+                 newest 为 (创建时间戳, id)，relevance 为 (得分, 创建时间戳, id)；
+                 facets 时返回 (结果列表, {分类id: 命中数})
+        """
+        query = normalize(query)
+        relevance = sort == 'relevance'
+        with self._lock:
+            hits = []
+            counts = Counter()
+            pinyin_ids = self._prefix_ids(query) if PINYIN_QUERY.match(query) else set()
+            candidates = self._candidates(query)
+            if pinyin_ids:
+                candidates = pinyin_ids.union(candidates)
+            # n-gram 交集可能有误报，用原始子串再校验一次
+            matches = [
+                product_id for product_id in candidates
+                if (product_id in pinyin_ids or query in self._docs[product_id][0])
+                and (status is None or self._docs[product_id][1] == status)
+            ]
+            if relevance and not matches:
+                # 精确、前缀、子串都没有命中时才做容错匹配
+                matches = [
+                    product_id for product_id in self._fuzzy_candidates(query)
+                    if status is None or self._docs[product_id][1] == status
+                ]
+            for product_id in matches:
+                text, doc_status, doc_category_id, sort_key = self._docs[product_id][:4]
+                matched_pinyin = product_id in pinyin_ids
+                if facets:
+                    counts[doc_category_id] += 1
+                if category_id and doc_category_id != category_id:
+                    continue
+                if relevance:
+                    sort_key = (self._score(query, text, matched_pinyin),) + sort_key
+                if before is not None and sort_key >= before:
+                    continue
+                hits.append(sort_key)
+        hits.sort(reverse=True)
+        result = hits if with_keys else [key[-1] for key in hits]
+        if facets:
+            return result, dict(counts)
+        return result
+
+    def category_counts(self, status=None):
+        """
+        各分类的产品数量（随索引增删维护，不扫描产品）
+        :param status: 状态筛选，None 表示不限
+        :return: {分类id: 数量}
+        """
+        counts = Counter()
+        with self._lock:
+            for (doc_status, category_id), count in self._category_counts.items():
+                if status is None or doc_status == status:
+                    counts[category_id] += count
+        return dict(counts)
+
+    def suggest(self, query, limit=10, status='active'):
+        """
+        输入联想：按名称、货号、条码或拼音前缀返回少量候选
+        只扫描有序数组中前缀相同的一小段，不访问数据库
+        :return: [{'id', 'name', 'product_code'}]，匹配键越短越靠前
+        """
+        query = normalize(query)
+        if not query:
+            return []
+        matches = {}
+        with self._lock:
+            i = bisect_left(self._prefixes, (query,))
+            end = min(len(self._prefixes), i + SUGGEST_SCAN_LIMIT)
+            while i < end and self._prefixes[i][0].startswith(query):
+                key, product_id = self._prefixes[i]
+                i += 1
+                doc = self._docs[product_id]
+                if status is not None and doc[1] != status:
+                    continue
+                if product_id not in matches or len(key) < matches[product_id][0]:
+                    matches[product_id] = (len(key), doc[3], doc[5])
+        ranked = sorted(matches.items(), key=lambda item: (item[1][0], -item[1][1][0], -item[0]))
+        return [
+            {'id': product_id, 'name': display[0], 'product_code': display[1]}
+            for product_id, (_, _, display) in ranked[:limit]
+        ]
+
+    def lookup(self, codes, status='active'):
+        """
+        按完整货号或条码精确查找
+        :param codes: 编码列表
+        :param status: 状态筛选，None 表示不限
+        :return: {原始编码: 产品id或None}，货号命中优先于条码命中
+        """
+        result = {}
+        with self._lock:
+            for code in codes:
+                key = normalize(code)
+                best = None
+                for product_id in self._codes.get(key, ()):
+                    text, doc_status = self._docs[product_id][:2]
+                    if status is not None and doc_status != status:
+                        continue
+                    # 货号唯一，命中货号直接返回；多个条码命中取最新的产品
+                    if text.split(FIELD_SEPARATOR, 1)[0] == key:
+                        best = product_id
+                        break
+                    if best is None or self._docs[product_id][3] > self._docs[best][3]:
+                        best = product_id
+                result[code] = best
+        return result
+
+
+class IndexPagination(Pagination):
+    """基于索引结果的分页，只查询当前页的产品"""
+
+    def _query_items(self):
+        ids = self._query_args['ids']
+        page_ids = ids[self._query_offset:self._query_offset + self.per_page]
+        return SearchService.load_products(page_ids, columns=self._query_args.get('columns'))
+
+    def _query_count(self):
+        return len(self._query_args['ids'])
+
+
+class SearchService:
+
+    _index = ProductSearchIndex()
+
+    @staticmethod
+    def _index_query():
+        """索引所需的列（不加载描述等大字段）"""
+        return db.session.query(
+            Product.id, Product.product_code, Product.barcode, Product.name,
+            Product.model, Product.status, Product.category_id, Product.created_at,
+            Product.updated_at, ProductSearchKey.name_pinyin, ProductSearchKey.name_initials
+        ).outerjoin(ProductSearchKey, ProductSearchKey.product_id == Product.id)
+
+    @staticmethod
+    def get_index(max_staleness=0):
+        """
+        获取索引
+        应用启动时由后台线程构建（见 warm_up），未启用时首次使用时构建；
+        目录版本号变化（可能来自其他 worker 的写入）时增量同步
+        :param max_staleness: 距上次检查版本号不足该秒数时直接使用内存索引，不访问数据库
+        """
+        index = SearchService._index
+        if index.built and time.monotonic() - index.checked_at < max_staleness:
+            return index
+
+        thread = index.warm_up_thread
+        if not index.built and thread is not None and thread is not threading.current_thread():
+            # 启动后的第一批请求等待后台构建完成，不再各自全量构建
+            thread.join()
+
+        version = CatalogService.get_version()
+        if not index.built:
+            tombstone_id = db.session.query(db.func.max(ProductTombstone.id)).scalar() or 0
+            index.build(SearchService._index_query().yield_per(1000), version, tombstone_id)
+        elif index.version != version:
+            SearchService._sync(index, version)
+        index.checked_at = time.monotonic()
+        return index
+
+    @staticmethod
+    def _sync(index, version):
+        """按 updated_at 增量同步新增和修改的产品，按删除记录（ProductTombstone）移除已删除的产品"""
+        tombstones = db.session.query(ProductTombstone.id, ProductTombstone.product_id).filter(
+            ProductTombstone.id > index.tombstone_id
+        ).order_by(ProductTombstone.id).all()
+        rows = SearchService._index_query()
+        if index.synced_at:
+            rows = rows.filter(Product.updated_at >= index.synced_at - SYNC_OVERLAP)
+        index.sync(rows.yield_per(1000), version,
+                   removed=[tombstone.product_id for tombstone in tombstones],
+                   tombstone_id=tombstones[-1].id if tombstones else None)
+
+    @staticmethod
+    def warm_up(app):
+        """在后台线程中构建索引（应用启动时调用），全量构建不占用用户请求"""
+        def build():
+            with app.app_context():
+                try:
+                    SearchService.get_index()
+                except Exception as e:
+                    # 构建失败时由第一个请求重新构建
+                    app.logger.error(f'构建产品搜索索引失败: {str(e)}')
+                finally:
+                    db.session.remove()
+
+        thread = threading.Thread(target=build, name='search-index-warm-up', daemon=True)
+        SearchService._index.warm_up_thread = thread
+        thread.start()
+        return thread
+
+    @staticmethod
+    def rebuild():
+        """强制全量重建索引"""
+        SearchService._index.built = False
+        return SearchService.get_index()
+
+    @staticmethod
+    def search_ids(query, category_id=None, status='active', sort='newest'):
+        """返回匹配关键词的产品 id 列表（按创建时间倒序或相关度排序）"""
+        return SearchService.get_index().search(query, category_id=category_id, status=status, sort=sort)
+
+    @staticmethod
+    def category_counts(status=None):
+        """各分类的产品数量 {分类id: 数量}，从索引维护的计数读取，不执行 COUNT"""
+        return SearchService.get_index().category_counts(status=status)
+
+    @staticmethod
+    def suggest(query, limit=10, status='active'):
+        """输入联想，最多每隔 SUGGEST_MAX_STALENESS 秒核对一次目录版本号"""
+        return SearchService.get_index(max_staleness=SUGGEST_MAX_STALENESS).suggest(
+            query, limit=limit, status=status
+        )
+
+    @staticmethod
+    def lookup_ids(codes, status='active'):
+        """按完整货号/条码精确查找，返回 {编码: 产品id或None}"""
+        return SearchService.get_index().lookup(codes, status=status)
+
+    @staticmethod
+    def lookup_products(codes, status='active'):
+        """按完整货号/条码精确查找，返回 {编码: 产品或None}，一次查询加载全部命中的产品"""
+        code_ids = SearchService.lookup_ids(codes, status=status)
+        ids = list({product_id for product_id in code_ids.values() if product_id is not None})
+        products = {product.id: product for product in SearchService.load_products(ids)}
+        return {code: products.get(product_id) for code, product_id in code_ids.items()}
+
+    @staticmethod
+    def _with_columns(products_query, columns):
+        """
+        只从数据库加载指定的列，其余列延迟加载
+        :param columns: 列名列表，None 表示加载全部列；id 和 created_at（分页游标需要）总是加载
+        """
+        if not columns:
+            return products_query
+        names = {'id', 'created_at', *columns}
+        return products_query.options(load_only(*[getattr(Product, name) for name in sorted(names)]))
+
+    @staticmethod
+    def load_products(ids, columns=None):
+        """
+        按 id 批量加载产品，保持传入顺序
+        :param columns: 只加载的列名，None 表示全部列
+        """
+        products = {}
+        products_query = SearchService._with_columns(Product.query, columns)
+        for i in range(0, len(ids), LOAD_CHUNK_SIZE):
+            chunk = ids[i:i + LOAD_CHUNK_SIZE]
+            for product in products_query.filter(Product.id.in_(chunk)).all():
+                products[product.id] = product
+        return [products[product_id] for product_id in ids if product_id in products]
+
+    @staticmethod
+    def search_products(query, category_id=None, status='active'):
+        """搜索产品并返回全部匹配的产品对象"""
+        return SearchService.load_products(SearchService.search_ids(query, category_id, status))
+
+    @staticmethod
+    def paginate(query, category_id=None, status='active', page=1, per_page=20, sort='newest',
+                 columns=None, facets=False):
+        """
+        分页搜索产品
+        有关键词时走倒排索引，否则直接按分类/状态查询数据库
+        :param sort: newest 或 relevance（仅对关键词搜索有效）
+        :param columns: 只加载的列名，None 表示全部列
+        :param facets: 是否统计各分类的命中数，结果放在返回对象的 facets 属性（{分类id: 数量}）
+        :return: Pagination 对象（与 Query.paginate 用法一致）
+        """
+        query = (query or '').strip()
+        if query:
+            result = SearchService.get_index().search(
+                query, category_id=category_id, status=status, sort=sort, facets=facets
+            )
+            ids, facet_counts = result if facets else (result, None)
+            pagination = IndexPagination(page=page, per_page=per_page, error_out=False, ids=ids,
+                                         columns=columns)
+        else:
+            products_query = SearchService._with_columns(Product.query, columns)
+            if status is not None:
+                products_query = products_query.filter_by(status=status)
+            if category_id:
+                products_query = products_query.filter_by(category_id=category_id)
+
+            pagination = products_query.order_by(Product.created_at.desc()).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            facet_counts = SearchService.category_counts(status=status) if facets else None
+
+        pagination.facets = facet_counts
+        return pagination
+
+    @staticmethod
+    def cursor_paginate(query, category_id=None, status='active', cursor=None, per_page=20,
+                        with_total=False, sort='newest', columns=None, facets=False):
+        """
+        游标分页搜索产品（按创建时间、id 倒序，关键词搜索可按相关度）
+        :param cursor: 上一页返回的 next_cursor，None 表示第一页
+        :param with_total: 是否返回总数；走索引时总数几乎没有额外开销
+        :param sort: newest 或 relevance（仅对关键词搜索有效）
+        :param columns: 只加载的列名，None 表示全部列
+        :param facets: 是否统计各分类的命中数，结果放在返回对象的 facets 属性（{分类id: 数量}）
+        :return: CursorPage
+        :raises ValueError: 游标格式错误
+        """
+        query = (query or '').strip()
+        if not query:
+            products_query = SearchService._with_columns(Product.query, columns)
+            if status is not None:
+                products_query = products_query.filter_by(status=status)
+            if category_id:
+                products_query = products_query.filter_by(category_id=category_id)
+            page = PaginationService.keyset_paginate(
+                products_query, Product, cursor=cursor, per_page=per_page, with_total=with_total
+            )
+            page.facets = SearchService.category_counts(status=status) if facets else None
+            return page
+
+        index = SearchService.get_index()
+        relevance = sort == 'relevance'
+        position = PaginationService.decode_cursor(cursor)
+        before = None
+        if position:
+            created_at, product_id, rank = position
+            if relevance and rank is None:
+                raise ValueError('无效的分页游标')
+            before = (created_at.timestamp() if created_at else 0, product_id)
+            if relevance:
+                before = (rank,) + before
+
+        keys = index.search(query, category_id=category_id, status=status,
+                            before=before, sort=sort, with_keys=True, facets=facets)
+        keys, facet_counts = keys if facets else (keys, None)
+        page_keys = keys[:per_page]
+        items = SearchService.load_products([key[-1] for key in page_keys], columns=columns)
+
+        next_cursor = None
+        if len(keys) > per_page and items:
+            last = items[-1]
+            rank = None
+            if relevance:
+                rank = next(key[0] for key in page_keys if key[-1] == last.id)
+            next_cursor = PaginationService.encode_cursor(last.created_at, last.id, rank=rank)
+
+        total = None
+        if with_total:
+            if before is None:
+                total = len(keys)
+            elif facet_counts is not None:
+                # 分类命中数不受游标限制，可以直接得出总数
+                total = facet_counts.get(category_id, 0) if category_id else sum(facet_counts.values())
+            else:
+                total = len(index.search(query, category_id=category_id, status=status, sort=sort))
+
+        return CursorPage(items, next_cursor=next_cursor, total=total, facets=facet_counts)
+
+    @staticmethod
+    def index_product(product):
+        """产品新增或修改后更新索引"""
+        index = SearchService._index
+        if index.built:
+            index.upsert(product.id, ProductSearchIndex.make_doc(product))
+
+    @staticmethod
+    def refresh_products(product_ids):
+        """按 id 从数据库重新读取并更新索引（用于批量导入）"""
+        index = SearchService._index
+        if not index.built:
+            return
+        for i in range(0, len(product_ids), LOAD_CHUNK_SIZE):
+            chunk = product_ids[i:i + LOAD_CHUNK_SIZE]
+            rows = SearchService._index_query().filter(Product.id.in_(chunk)).all()
+            for row in rows:
+                index.upsert(row.id, ProductSearchIndex.make_doc(row))
+
+    @staticmethod
+    def remove_product(product_id):
+        """产品删除后从索引移除"""
+        SearchService._index.remove(product_id)
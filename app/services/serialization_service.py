@@ -0,0 +1,102 @@
+"""
+产品序列化服务
+把产品编码成 JSON 片段并按 (产品id, updated_at) 缓存，
+搜索、详情、批量获取接口直接拼接缓存的片段，不再逐个产品构建字典再编码
+"""
+import json
+from app.services.cache_service import LRUCache
+from app.services.product_service import ProductService
+
+
+# 列表（搜索结果）中每个产品包含的列
+LIST_COLUMNS = (
+    'id', 'product_code', 'barcode', 'name', 'model', 'specification', 'unit',
+    'retail_price', 'wholesale_price', 'wholesale_min_qty', 'stock', 'description'
+)
+# 详情比列表多分类 id，图片字段为 images
+DETAIL_COLUMNS = LIST_COLUMNS + ('category_id',)
+
+# 片段缓存的条目上限（每个产品列表、详情各一条）
+FRAGMENT_CACHE_SIZE = 20000
+
+
+def dumps(value):
+    """紧凑编码 JSON（中文不转义）"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class SerializationService:
+
+    # 产品的 updated_at 随任何修改变化（包括图片，见 ProductService.touch_products），
+    # 所以缓存不按目录版本号失效
+    _fragments = LRUCache(maxsize=FRAGMENT_CACHE_SIZE)
+
+    @staticmethod
+    def _list_dict(product, images):
+        data = {column: getattr(product, column) for column in LIST_COLUMNS}
+        data['primary_image'] = images[0] if images else None
+        data['all_images'] = images
+        return data
+
+    @staticmethod
+    def _detail_dict(product, images):
+        data = {column: getattr(product, column) for column in DETAIL_COLUMNS}
+        data['images'] = images
+        return data
+
+    @staticmethod
+    def _fragments_for(products, shape, build):
+        """
+        获取一组产品的 JSON 片段，只为未命中缓存的产品查询图片
+        :return: 与 products 顺序一致的片段列表
+        """
+        keys = [(shape, product.id, product.updated_at) for product in products]
+        fragments = [SerializationService._fragments.get(key) for key in keys]
+
+        missing = [product for product, fragment in zip(products, fragments) if fragment is None]
+        if missing:
+            images_map = ProductService.get_image_urls_map([product.id for product in missing])
+            for i, product in enumerate(products):
+                if fragments[i] is None:
+                    fragments[i] = dumps(build(product, images_map[product.id]))
+                    SerializationService._fragments.set(keys[i], fragments[i])
+        return fragments
+
+    @staticmethod
+    def list_fragments(products):
+        """搜索结果中的产品片段（含主图和全部图片）"""
+        return SerializationService._fragments_for(products, 'list', SerializationService._list_dict)
+
+    @staticmethod
+    def detail_fragments(products):
+        """产品详情片段（含分类 id 和全部图片）"""
+        return SerializationService._fragments_for(products, 'detail', SerializationService._detail_dict)
+
+    @staticmethod
+    def cached_detail_fragment(product_id, updated_at):
+        """按 id 和修改时间读取已缓存的详情片段，未命中返回 None（无需加载产品）"""
+        return SerializationService._fragments.get(('detail', product_id, updated_at))
+
+    @staticmethod
+    def render(envelope, key, fragments):
+        """
+        把产品片段拼接进响应 JSON
+        :param envelope: 其余字段（不能为空）
+        :param key: 产品列表所在的字段名
+        :param fragments: 单个片段、片段列表，或 {id: 片段}（输出为 JSON 对象）
+        :return: JSON 字符串
+        """
+        if isinstance(fragments, str):
+            products = fragments
+        elif isinstance(fragments, dict):
+            products = '{' + ','.join(
+                f'{dumps(str(product_id))}:{fragment}' for product_id, fragment in fragments.items()
+            ) + '}'
+        else:
+            products = '[' + ','.join(fragments) + ']'
+        return f'{dumps(envelope)[:-1]},{dumps(key)}:{products}}}'
+
+    @staticmethod
+    def clear():
+        """清空片段缓存"""
+        SerializationService._fragments.clear()
@@ -0,0 +1,194 @@
+"""
+产品目录快照服务
+定期把上架产品（含图片地址）导出为按目录版本号命名、不再修改的 gzip 快照文件，
+并生成相邻版本之间的补丁文件，由 nginx 直接从 /static/catalog/ 提供下载。
+
+目录结构：
+    manifest.json                   最新版本、快照文件及可用补丁列表（终端先下载它）
+    catalog-v{版本}.ndjson.gz        快照：每行一个产品的 JSON，按 id 排序
+    catalog-v{旧}-v{新}.patch.json.gz 补丁：{"from", "to", "sha256", "upsert": [产品], "delete": [id]}
+
+终端本地版本为 v 时，按 manifest 中的补丁依次升级到最新版本，
+用 sha256 校验结果（按 id 排序、每行一个产品重新编码后的摘要，与快照解压后的内容一致）；补丁链断开时下载完整快照。
+"""
+import gzip
+import hashlib
+import json
+import os
+from datetime import datetime
+from flask import current_app
+from app.models import db, Product
+from app.services.catalog_service import CatalogService
+from app.services.product_service import ProductService
+
+
+# 快照中每个产品包含的列
+SNAPSHOT_COLUMNS = (
+    'id', 'product_code', 'barcode', 'name', 'model', 'specification', 'unit',
+    'retail_price', 'wholesale_price', 'wholesale_min_qty', 'stock', 'category_id'
+)
+MANIFEST_FILE = 'manifest.json'
+# 保留的快照数量（补丁只保留这些版本之间的）
+SNAPSHOT_KEEP = 10
+# 每批读取的产品数
+SNAPSHOT_BATCH_SIZE = 1000
+
+
+def snapshot_file(version):
+    return f'catalog-v{version}.ndjson.gz'
+
+
+def patch_file(from_version, to_version):
+    return f'catalog-v{from_version}-v{to_version}.patch.json.gz'
+
+
+def encode_line(record):
+    """规范化编码一行（键排序），保证相同数据生成相同的快照"""
+    return json.dumps(record, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+
+class SnapshotService:
+
+    @staticmethod
+    def get_folder():
+        """快照目录（不存在时创建）"""
+        folder = current_app.config['CATALOG_SNAPSHOT_FOLDER']
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def read_manifest(folder=None):
+        """读取 manifest，尚未生成过快照时返回 None"""
+        path = os.path.join(folder or SnapshotService.get_folder(), MANIFEST_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def iter_lines():
+        """按 id 顺序逐批读取上架产品及其图片，产出快照行"""
+        products = db.session.query(*[getattr(Product, column) for column in SNAPSHOT_COLUMNS]).filter(
+            Product.status == 'active'
+        ).order_by(Product.id)
+
+        batch = []
+        for row in products.yield_per(SNAPSHOT_BATCH_SIZE):
+            batch.append(row)
+            if len(batch) == SNAPSHOT_BATCH_SIZE:
+                yield from SnapshotService._encode_batch(batch)
+                batch = []
+        yield from SnapshotService._encode_batch(batch)
+
+    @staticmethod
+    def _encode_batch(rows):
+        images_map = ProductService.get_image_urls_map([row.id for row in rows])
+        for row in rows:
+            record = row._asdict()
+            record['images'] = images_map[row.id]
+            yield encode_line(record)
+
+    @staticmethod
+    def _write_gzip(path, data):
+        """原子写入 gzip 文件（mtime 固定，相同内容得到相同文件）"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+                f.write(data)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _load_snapshot(path):
+        """读取快照为 {产品id: 行}"""
+        lines = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                line = line.rstrip('\n')
+                if line:
+                    lines[json.loads(line)['id']] = line
+        return lines
+
+    @staticmethod
+    def build_snapshot(force=False):
+        """
+        生成当前目录版本的快照，以及与上一个快照之间的补丁
+        :param force: 版本号未变化时也重新生成
+        :return: 新的 manifest；目录版本号未变化时返回 None
+        """
+        folder = SnapshotService.get_folder()
+        manifest = SnapshotService.read_manifest(folder)
+        # 先读版本号再读数据：快照内容不会比版本号旧，之后的写入会进入下一个版本
+        version = CatalogService.get_state()[0]
+        if manifest and manifest['version'] == version and not force:
+            return None
+
+        lines = list(SnapshotService.iter_lines())
+        content = ''.join(line + '\n' for line in lines).encode('utf-8')
+        sha256 = hashlib.sha256(content).hexdigest()
+        SnapshotService._write_gzip(os.path.join(folder, snapshot_file(version)), content)
+
+        snapshots = [item for item in (manifest or {}).get('snapshots', []) if item['version'] != version]
+        patches = [item for item in (manifest or {}).get('patches', []) if item['to'] != version]
+
+        # 与上一个快照比较，生成补丁
+        previous = snapshots[-1] if snapshots else None
+        if previous and os.path.exists(os.path.join(folder, previous['file'])):
+            old_lines = SnapshotService._load_snapshot(os.path.join(folder, previous['file']))
+            new_lines = {json.loads(line)['id']: line for line in lines}
+            patch = {
+                'from': previous['version'],
+                'to': version,
+                'sha256': sha256,
+                'upsert': [json.loads(line) for product_id, line in new_lines.items()
+                           if old_lines.get(product_id) != line],
+                'delete': [product_id for product_id in old_lines if product_id not in new_lines]
+            }
+            name = patch_file(previous['version'], version)
+            SnapshotService._write_gzip(os.path.join(folder, name), encode_line(patch).encode('utf-8'))
+            patches.append({
+                'from': previous['version'],
+                'to': version,
+                'file': name,
+                'size': os.path.getsize(os.path.join(folder, name))
+            })
+
+        snapshots.append({
+            'version': version,
+            'file': snapshot_file(version),
+            'sha256': sha256,
+            'count': len(lines),
+            'size': os.path.getsize(os.path.join(folder, snapshot_file(version))),
+            'created_at': datetime.utcnow().isoformat()
+        })
+
+        # 只保留最近的快照及其之间的补丁
+        snapshots = snapshots[-SNAPSHOT_KEEP:]
+        oldest = snapshots[0]['version']
+        patches = [item for item in patches if item['from'] >= oldest]
+
+        manifest = {
+            'version': version,
+            'snapshot': snapshots[-1],
+            'snapshots': snapshots,
+            'patches': patches
+        }
+        tmp_path = os.path.join(folder, MANIFEST_FILE + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, os.path.join(folder, MANIFEST_FILE))
+
+        SnapshotService._remove_stale_files(folder, manifest)
+        return manifest
+
+    @staticmethod
+    def _remove_stale_files(folder, manifest):
+        """删除 manifest 中已不再引用的快照和补丁"""
+        keep = {MANIFEST_FILE}
+        keep.update(item['file'] for item in manifest['snapshots'])
+        keep.update(item['file'] for item in manifest['patches'])
+        for name in os.listdir(folder):
+            if name.startswith('catalog-v') and name not in keep:
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
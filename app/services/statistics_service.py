@@ -1,13 +1,19 @@
 """
 数据统计服务
 提供销售额、产品比例、客户排名、畅销滞销品等统计功能
+订单数据按日期范围从热表、归档表或两者合并中读取（见 ArchiveService）
 """
-from app.models import db, Order, OrderItem, Product
+from app.models import db, Product
+from app.services.archive_service import ArchiveService
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, or_
 import pandas as pd
 
 
+# 计入销售额的订单状态
+SALES_STATUSES = ('confirmed', 'shipped', 'completed')
+
+
 class StatisticsService:
     
     @staticmethod
@@ -18,32 +24,16 @@ class StatisticsService:
         :param end_date: 结束日期 (datetime.date)
         :return: dict
         """
-        query = Order.query.filter(
-            Order.status.in_(['confirmed', 'shipped', 'completed'])
-        )
-        
-        if start_date:
-            query = query.filter(Order.created_at >= start_date)
-        if end_date:
-            query = query.filter(Order.created_at <= end_date)
-        
-        # 基础统计
-        total_orders = query.count()
-        total_sales = db.session.query(func.sum(Order.total_amount)).filter(
-            and_(
-                Order.status.in_(['confirmed', 'shipped', 'completed']),
-                Order.created_at >= start_date if start_date else True,
-                Order.created_at <= end_date if end_date else True
-            )
-        ).scalar() or 0
+        orders = ArchiveService.order_rows(start_date, end_date, SALES_STATUSES)
         
-        total_quantity = db.session.query(func.sum(Order.total_quantity)).filter(
-            and_(
-                Order.status.in_(['confirmed', 'shipped', 'completed']),
-                Order.created_at >= start_date if start_date else True,
-                Order.created_at <= end_date if end_date else True
-            )
-        ).scalar() or 0
+        # 基础统计（一次查询）
+        total_orders, total_sales, total_quantity = db.session.query(
+            func.count(orders.c.id),
+            func.sum(orders.c.total_amount),
+            func.sum(orders.c.total_quantity)
+        ).one()
+        total_sales = total_sales or 0
+        total_quantity = total_quantity or 0
         
         # 平均订单金额
         avg_order_amount = total_sales / total_orders if total_orders > 0 else 0
@@ -65,27 +55,19 @@ class StatisticsService:
         :return: list of dict
         """
         # 查询每个产品的销售数据
+        lines = ArchiveService.order_lines(start_date, end_date, SALES_STATUSES)
         query = db.session.query(
             Product.id,
             Product.product_code,
             Product.name,
-            func.sum(OrderItem.quantity).label('total_quantity'),
-            func.sum(OrderItem.subtotal).label('total_sales')
-        ).join(
-            OrderItem, Product.id == OrderItem.product_id
+            func.sum(lines.c.quantity).label('total_quantity'),
+            func.sum(lines.c.subtotal).label('total_sales')
         ).join(
-            Order, OrderItem.order_id == Order.id
-        ).filter(
-            Order.status.in_(['confirmed', 'shipped', 'completed'])
+            lines, Product.id == lines.c.product_id
         ).group_by(
             Product.id
         )
         
-        if start_date:
-            query = query.filter(Order.created_at >= start_date)
-        if end_date:
-            query = query.filter(Order.created_at <= end_date)
-        
         results = query.order_by(desc('total_sales')).limit(limit).all()
         
         return [
@@ -108,24 +90,18 @@ class StatisticsService:
         :param limit: 返回数量限制
         :return: list of dict
         """
+        orders = ArchiveService.order_rows(start_date, end_date, SALES_STATUSES)
         query = db.session.query(
-            Order.customer_name,
-            Order.customer_phone,
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_amount'),
-            func.sum(Order.total_quantity).label('total_quantity')
-        ).filter(
-            Order.status.in_(['confirmed', 'shipped', 'completed'])
+            orders.c.customer_name,
+            orders.c.customer_phone,
+            func.count(orders.c.id).label('order_count'),
+            func.sum(orders.c.total_amount).label('total_amount'),
+            func.sum(orders.c.total_quantity).label('total_quantity')
         ).group_by(
-            Order.customer_name,
-            Order.customer_phone
+            orders.c.customer_name,
+            orders.c.customer_phone
         )
         
-        if start_date:
-            query = query.filter(Order.created_at >= start_date)
-        if end_date:
-            query = query.filter(Order.created_at <= end_date)
-        
         results = query.order_by(desc('total_amount')).limit(limit).all()
         
         return [
@@ -149,28 +125,20 @@ class StatisticsService:
         :param limit: 返回数量限制
         :return: list of dict
         """
+        lines = ArchiveService.order_lines(start_date, end_date, SALES_STATUSES)
         query = db.session.query(
             Product.id,
             Product.product_code,
             Product.name,
-            func.sum(OrderItem.quantity).label('total_quantity'),
-            func.sum(OrderItem.subtotal).label('total_sales'),
-            func.count(func.distinct(Order.id)).label('order_count')
-        ).join(
-            OrderItem, Product.id == OrderItem.product_id
+            func.sum(lines.c.quantity).label('total_quantity'),
+            func.sum(lines.c.subtotal).label('total_sales'),
+            func.count(func.distinct(lines.c.order_id)).label('order_count')
         ).join(
-            Order, OrderItem.order_id == Order.id
-        ).filter(
-            Order.status.in_(['confirmed', 'shipped', 'completed'])
+            lines, Product.id == lines.c.product_id
         ).group_by(
             Product.id
         )
         
-        if start_date:
-            query = query.filter(Order.created_at >= start_date)
-        if end_date:
-            query = query.filter(Order.created_at <= end_date)
-        
         results = query.order_by(desc('total_quantity')).limit(limit).all()
         
         return [
@@ -192,16 +160,13 @@ class StatisticsService:
         :param limit: 返回数量限制
         :return: list of dict
         """
-        # 获取所有有销售记录的产品
+        # 获取所有有销售记录的产品（包括已归档的订单）
+        lines = ArchiveService.order_lines(statuses=SALES_STATUSES)
         sold_products = db.session.query(
-            OrderItem.product_id,
-            func.max(Order.created_at).label('last_sale_date')
-        ).join(
-            Order, OrderItem.order_id == Order.id
-        ).filter(
-            Order.status.in_(['confirmed', 'shipped', 'completed'])
+            lines.c.product_id,
+            func.max(lines.c.created_at).label('last_sale_date')
         ).group_by(
-            OrderItem.product_id
+            lines.c.product_id
         ).subquery()
         
         # 30天前
@@ -262,18 +227,13 @@ class StatisticsService:
         )
         
         # 每日销售趋势
+        orders = ArchiveService.order_rows(start_date, end_date, SALES_STATUSES)
         daily_sales = db.session.query(
-            func.date(Order.created_at).label('date'),
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_sales')
-        ).filter(
-            and_(
-                Order.status.in_(['confirmed', 'shipped', 'completed']),
-                Order.created_at >= start_date,
-                Order.created_at <= end_date
-            )
+            func.date(orders.c.created_at).label('date'),
+            func.count(orders.c.id).label('order_count'),
+            func.sum(orders.c.total_amount).label('total_sales')
         ).group_by(
-            func.date(Order.created_at)
+            func.date(orders.c.created_at)
         ).order_by('date').all()
         
         # 畅销品
@@ -320,18 +280,13 @@ class StatisticsService:
         end_date = datetime(year + 1, 1, 1) - timedelta(seconds=1)
         
         # 月度销售趋势
+        orders = ArchiveService.order_rows(start_date, end_date, SALES_STATUSES)
         monthly_sales = db.session.query(
-            func.extract('month', Order.created_at).label('month'),
-            func.count(Order.id).label('order_count'),
-            func.sum(Order.total_amount).label('total_sales')
-        ).filter(
-            and_(
-                Order.status.in_(['confirmed', 'shipped', 'completed']),
-                Order.created_at >= start_date,
-                Order.created_at <= end_date
-            )
+            func.extract('month', orders.c.created_at).label('month'),
+            func.count(orders.c.id).label('order_count'),
+            func.sum(orders.c.total_amount).label('total_sales')
         ).group_by(
-            func.extract('month', Order.created_at)
+            func.extract('month', orders.c.created_at)
         ).order_by('month').all()
         
         # 创建完整的12个月数据
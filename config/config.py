@@ -14,6 +14,18 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'xlsx', 'xls', 'csv'}
     
+    # 产品目录快照（由 scripts/build_catalog_snapshot.py 生成，nginx 直接提供下载）
+    CATALOG_SNAPSHOT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app', 'static', 'catalog')
+    CATALOG_SNAPSHOT_INTERVAL = int(os.environ.get('CATALOG_SNAPSHOT_INTERVAL') or 300)  # 秒
+    
+    # 应用启动时在后台线程中构建产品搜索索引（否则由第一个搜索请求构建）
+    # 脚本和投递进程用不到索引，默认不构建；Web 入口（app.py、wsgi.py）默认开启
+    SEARCH_INDEX_WARM_UP = os.environ.get('SEARCH_INDEX_WARM_UP', 'false').lower() in ['true', 'on', '1']
+    
+    # 订单归档：下单超过 ORDER_HOT_DAYS 天的订单由 scripts/archive_orders.py 迁入归档表
+    ORDER_HOT_DAYS = int(os.environ.get('ORDER_HOT_DAYS') or 90)
+    ORDER_ARCHIVE_INTERVAL = int(os.environ.get('ORDER_ARCHIVE_INTERVAL') or 86400)  # 秒
+    
     # 邮件配置
     MAIL_SERVER = os.environ.get('MAIL_SERVER') or 'smtp.example.com'
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
@@ -23,6 +35,11 @@ class Config:
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER') or 'noreply@example.com'
     
+    # 通知发件箱：是否在应用进程内启动后台投递线程
+    # 脚本默认不启动；Web 入口（app.py、wsgi.py）默认启动，运行独立进程 scripts/notification_worker.py 时可关闭
+    NOTIFICATION_WORKER_THREAD = os.environ.get('NOTIFICATION_WORKER_THREAD', 'false').lower() in ['true', 'on', '1']
+    NOTIFICATION_WORKER_INTERVAL = int(os.environ.get('NOTIFICATION_WORKER_INTERVAL') or 5)  # 秒
+    
     # 短信配置（示例配置，实际使用需要对接短信服务商）
     SMS_API_URL = os.environ.get('SMS_API_URL')
     SMS_API_KEY = os.environ.get('SMS_API_KEY')
@@ -63,6 +80,7 @@ class ProductionConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
+    SEARCH_INDEX_WARM_UP = False
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
 
 config = {
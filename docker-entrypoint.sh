@@ -35,6 +35,12 @@ else
     echo "系统已初始化，跳过数据初始化步骤"
 fi
 
+# 补齐产品拼音检索键和订单搜索检索词（升级前的数据、脚本导入的数据），已有的不会重复处理
+echo "补齐产品拼音检索键..."
+python scripts/backfill_search_keys.py
+echo "补齐订单搜索检索词..."
+python scripts/rebuild_order_search.py
+
 echo ""
 echo "=========================================="
 echo "启动应用服务..."
@@ -14,6 +14,8 @@ os.environ['FLASK_ENV'] = 'production'
 
 from app import create_app
 from app.models import db, User, Category, Product, ProductImage, Order, OrderItem
+from app.services.order_search_service import OrderSearchService
+from app.services.product_service import ProductService
 
 app = create_app('development')
 
@@ -102,6 +104,7 @@ def generate_test_data():
                 status='active',
                 category_id=category.id if category else None
             )
+            ProductService.update_search_key(product)
             db.session.add(product)
             db.session.commit()
             
@@ -184,7 +187,8 @@ def generate_test_data():
             print(f"  ✓ 创建订单: {order_no} ({status}) - ¥{total_amount:.2f}")
         
         print("\n[4/5] 更新统计数据...")
-        # 统计数据由 API 动态计算，无需额外操作
+        # 统计数据由 API 动态计算；直接插入的订单补齐搜索检索词
+        OrderSearchService.catch_up()
         
         print("\n[5/5] 完成数据生成")
         print("=" * 60)
@@ -16,6 +16,7 @@ from app import create_app
 from app.models import db, User, SystemSetting, Product, ProductImage, Order, OrderItem, Category
 from app.services.product_service import ProductService
 from app.services.order_service import OrderService
+from app.services.order_search_service import OrderSearchService
 
 # Unsplash免费图片URL（日用产品相关）
 PRODUCT_IMAGES = {
@@ -221,6 +222,7 @@ def create_default_products(app):
                 category_id=category.id if category else None,
                 status='active'
             )
+            ProductService.update_search_key(product)
             
             db.session.add(product)
             created_count += 1
@@ -461,6 +463,8 @@ def generate_test_orders(app):
             created = generate_orders_for_month(app, year, month, num_orders)
             total_orders += created
         
+        # 直接插入的订单没有检索词，补齐后才能在后台按订单号、电话、姓名搜索
+        OrderSearchService.catch_up()
         print(f"✓ 订单数据生成完成 - 共生成 {total_orders} 个订单")
 
 
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+订单归档脚本
+
+把下单超过保留期（ORDER_HOT_DAYS，默认 90 天）的订单及明细迁入归档表，
+后台列表、统计和订单查询会自动合并归档数据。整个部署只需运行一个实例。
+
+用法：
+    python scripts/archive_orders.py              # 归档一次（适合 cron）
+    python scripts/archive_orders.py --days 30    # 指定保留天数
+    python scripts/archive_orders.py --loop       # 后台常驻，每隔 ORDER_ARCHIVE_INTERVAL 秒归档一次
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click
+from app import create_app, db
+from app.services.archive_service import ArchiveService
+
+
+@click.command()
+@click.option('--loop', is_flag=True, help='常驻运行，定期归档')
+@click.option('--days', type=int, default=None, help='热数据保留天数（默认 ORDER_HOT_DAYS）')
+def archive_orders(loop, days):
+    """归档超过保留期的订单"""
+
+    app = create_app(os.environ.get('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        if not loop:
+            click.echo(f'已归档 {ArchiveService.archive_orders(hot_days=days)} 个订单')
+            return
+
+        interval = app.config['ORDER_ARCHIVE_INTERVAL']
+        click.echo(f'归档任务已启动，每 {interval} 秒运行一次')
+        while True:
+            try:
+                count = ArchiveService.archive_orders(hot_days=days)
+                if count:
+                    click.echo(f'已归档 {count} 个订单')
+            except Exception as e:
+                db.session.rollback()
+                click.echo(click.style(f'归档失败: {str(e)}', fg='red'))
+            finally:
+                # 结束本轮事务，下一轮读取最新数据
+                db.session.remove()
+            time.sleep(interval)
+
+if __name__ == '__main__':
+    archive_orders()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+补齐产品拼音检索键
+
+保存产品时会自动计算名称的全拼和首字母，已有产品（升级前的数据、脚本导入的产品）
+需要运行一次本脚本生成检索键；没有检索键的产品每次构建搜索索引都要现算拼音。
+
+用法：
+    python scripts/backfill_search_keys.py
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click
+from app import create_app
+from app.services.product_service import ProductService
+
+
+@click.command()
+def backfill_search_keys():
+    """为没有拼音检索键的产品生成检索键"""
+
+    app = create_app(os.environ.get('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        count = ProductService.backfill_search_keys()
+    click.echo(f'已为 {count} 个产品生成拼音检索键')
+
+if __name__ == '__main__':
+    backfill_search_keys()
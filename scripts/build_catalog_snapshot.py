@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+产品目录快照生成脚本
+
+目录版本号变化时生成新的快照和补丁文件（写入 CATALOG_SNAPSHOT_FOLDER，默认 app/static/catalog），
+版本号未变化时什么也不做。整个部署只需运行一个实例（不要放在每个 gunicorn worker 里）。
+
+用法：
+    python scripts/build_catalog_snapshot.py            # 生成一次（适合 cron）
+    python scripts/build_catalog_snapshot.py --loop     # 后台常驻，每隔 CATALOG_SNAPSHOT_INTERVAL 秒检查一次
+    python scripts/build_catalog_snapshot.py --force    # 版本号未变化也重新生成
+"""
+
+import sys
+import os
+import time
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click
+from app import create_app, db
+from app.services.snapshot_service import SnapshotService
+
+
+def build_once(force=False):
+    """生成一次快照并输出结果"""
+    manifest = SnapshotService.build_snapshot(force=force)
+    if manifest is None:
+        click.echo('目录版本号未变化，跳过')
+        return
+    snapshot = manifest['snapshot']
+    click.echo(f"已生成快照 v{snapshot['version']}: {snapshot['count']} 个产品, {snapshot['size']} 字节")
+    for patch in manifest['patches']:
+        if patch['to'] == snapshot['version']:
+            click.echo(f"补丁 v{patch['from']} -> v{patch['to']}: {patch['size']} 字节")
+
+
+@click.command()
+@click.option('--loop', is_flag=True, help='常驻运行，定期检查目录版本号')
+@click.option('--force', is_flag=True, help='版本号未变化也重新生成')
+def build_catalog_snapshot(loop, force):
+    """生成产品目录快照"""
+
+    app = create_app(os.environ.get('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        if not loop:
+            build_once(force)
+            return
+
+        interval = app.config['CATALOG_SNAPSHOT_INTERVAL']
+        click.echo(f'快照任务已启动，每 {interval} 秒检查一次')
+        while True:
+            try:
+                build_once(force)
+            except Exception as e:
+                click.echo(click.style(f'生成快照失败: {str(e)}', fg='red'))
+            finally:
+                # 结束本轮事务，下一轮读取最新数据
+                db.session.remove()
+            force = False
+            time.sleep(interval)
+
+if __name__ == '__main__':
+    build_catalog_snapshot()
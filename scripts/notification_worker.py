@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+"""
+通知发件箱投递进程
+
+常驻运行，定期发送发件箱中待发送的订单邮件/短信通知，失败的按退避时间重试。
+可以同时运行多个实例，同一条通知只会被其中一个发送。
+
+用法：
+    python scripts/notification_worker.py          # 常驻运行
+    python scripts/notification_worker.py --once   # 只投递一轮（适合 cron）
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 本进程即为投递任务，不再额外启动投递线程
+os.environ['NOTIFICATION_WORKER_THREAD'] = 'false'
+
+import click
+from app import create_app
+from app.services.outbox_service import OutboxService
+
+
+@click.command()
+@click.option('--once', is_flag=True, help='只投递一轮后退出')
+def notification_worker(once):
+    """投递待发送的订单通知"""
+
+    app = create_app(os.environ.get('FLASK_ENV', 'development'))
+
+    if once:
+        with app.app_context():
+            processed = OutboxService.deliver_pending()
+        click.echo(f'已处理 {processed} 条通知')
+        return
+
+    interval = app.config['NOTIFICATION_WORKER_INTERVAL']
+    click.echo(f'通知投递任务已启动，每 {interval} 秒检查一次')
+    OutboxService.run_worker(app, interval=interval)
+
+if __name__ == '__main__':
+    notification_worker()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+重建订单搜索检索词
+
+新下单的订单会自动写入检索词，已有订单（升级前的数据、脚本导入的订单）
+需要运行一次本脚本生成检索词。
+
+用法：
+    python scripts/rebuild_order_search.py          # 只补齐尚未生成检索词的订单
+    python scripts/rebuild_order_search.py --full   # 清空后全部重建
+"""
+
+import sys
+import os
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import click
+from app import create_app
+from app.services.order_search_service import OrderSearchService
+
+
+@click.command()
+@click.option('--full', is_flag=True, help='清空后重建全部订单的检索词')
+def rebuild_order_search(full):
+    """生成订单搜索检索词"""
+
+    app = create_app(os.environ.get('FLASK_ENV', 'development'))
+
+    with app.app_context():
+        if full:
+            count = OrderSearchService.rebuild()
+        else:
+            count = OrderSearchService.catch_up()
+    click.echo(f'已为 {count} 个订单生成检索词')
+
+if __name__ == '__main__':
+    rebuild_order_search()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+订单创建性能测试
+下单的 SQL 查询次数必须与订单行数无关（商品一次 IN 查询加载，明细一次批量插入），
+耗时随行数基本持平；批量下单的查询次数与订单数无关，并与逐个下单对比吞吐量；
+批量下单中格式错误的订单只影响自身；单个下单接口对格式错误的商品返回 400
+"""
+import sys
+import os
+import time
+import statistics
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath('.'))
+
+from app import create_app
+from app.models import db, Product
+from app.services.order_service import OrderService
+from app.services.order_serialization_service import OrderSerializationService
+from test_query_count import QueryCounter
+
+# 测试的订单行数
+LINE_COUNTS = (1, 10, 50, 200)
+# 每种行数重复下单的次数
+ROUNDS = 5
+# 批量下单测试的订单数
+BATCH_SIZES = (10, 50, 200)
+# 批量下单测试中每个订单的行数
+BATCH_ORDER_LINES = 5
+
+
+def create_products(count):
+    """创建测试产品，返回 id 列表"""
+    products = [
+        Product(product_code=f'OB{i:04d}', name=f'下单测试产品{i}', retail_price=10, wholesale_price=8,
+                wholesale_min_qty=5, stock=100000)
+        for i in range(count)
+    ]
+    db.session.add_all(products)
+    db.session.commit()
+    return [product.id for product in products]
+
+
+def order_data(product_ids):
+    return {
+        'customer_name': '批发客户',
+        'customer_phone': '13800138000',
+        'items': [{'product_id': product_id, 'quantity': 6} for product_id in product_ids]
+    }
+
+
+def test_order_benchmark():
+    """测试下单查询次数与行数无关，并输出各行数的耗时"""
+    app = create_app('testing')
+
+    with app.app_context():
+        product_ids = create_products(max(LINE_COUNTS))
+        # 预热（系统设置、通知配置等）
+        OrderService.create_order(order_data(product_ids[:1]))
+
+        print("=== 订单创建性能测试 ===")
+        query_counts = {}
+        for lines in LINE_COUNTS:
+            timings = []
+            for _ in range(ROUNDS):
+                with QueryCounter(db.engine) as counter:
+                    start = time.perf_counter()
+                    order = OrderService.create_order(order_data(product_ids[:lines]))
+                    timings.append((time.perf_counter() - start) * 1000)
+                query_counts[lines] = counter.count
+                assert order.items.count() == lines
+            print(f"{lines:>4} 行: 中位数 {statistics.median(timings):.2f} ms, {query_counts[lines]} 次查询")
+
+        assert len(set(query_counts.values())) == 1, f'下单查询次数随行数增长: {query_counts}'
+        print("=== 所有测试通过 ===")
+
+
+def test_batch_order_benchmark():
+    """测试批量下单查询次数与订单数无关，并与逐个下单对比耗时"""
+    app = create_app('testing')
+
+    with app.app_context():
+        product_ids = create_products(BATCH_ORDER_LINES)
+        orders = [order_data(product_ids) for _ in range(max(BATCH_SIZES))]
+        # 预热
+        OrderService.create_orders(orders[:1])
+
+        print("=== 批量下单性能测试 ===")
+        query_counts = {}
+        for size in BATCH_SIZES:
+            with QueryCounter(db.engine) as counter:
+                start = time.perf_counter()
+                for data in orders[:size]:
+                    OrderService.create_order(data)
+                single_ms = (time.perf_counter() - start) * 1000
+            single_queries = counter.count
+
+            with QueryCounter(db.engine) as counter:
+                start = time.perf_counter()
+                results = OrderService.create_orders(orders[:size])
+                batch_ms = (time.perf_counter() - start) * 1000
+            query_counts[size] = counter.count
+            assert all(result['success'] for result in results)
+
+            print(f"{size:>4} 个订单: 逐个下单 {single_ms:.1f} ms / {single_queries} 次查询, "
+                  f"批量下单 {batch_ms:.1f} ms / {query_counts[size]} 次查询, "
+                  f"{single_ms / batch_ms:.1f} 倍")
+
+        # 订单号序号块用完时多一次申请（UPDATE + SELECT），其余查询次数固定
+        assert max(query_counts.values()) - min(query_counts.values()) <= 2, \
+            f'批量下单查询次数随订单数增长: {query_counts}'
+        print("=== 所有测试通过 ===")
+
+
+def test_batch_order_validation():
+    """测试批量下单中格式错误的订单只记为失败，不影响其他订单"""
+    app = create_app('testing')
+
+    with app.app_context():
+        product_ids = create_products(2)
+        valid = order_data(product_ids)
+        orders = [
+            valid,
+            {'customer_name': '批发客户', 'items': 'not-a-list'},
+            {'customer_name': '批发客户', 'items': 3},
+            {'customer_name': '批发客户', 'items': ['not-a-dict']},
+            {'customer_name': '批发客户', 'items': [{'product_id': [1], 'quantity': 1}]},
+            {'customer_name': '批发客户', 'items': [{'product_id': {'id': 1}, 'quantity': 1}]},
+            {'customer_name': '批发客户', 'items': [{'product_id': True, 'quantity': 1}]},
+            {'items': valid['items']},
+            'not-an-order',
+            valid,
+        ]
+        results = OrderService.create_orders(orders)
+        for result in results:
+            print(f"  订单 {result['index']}: {'成功' if result['success'] else result['message']}")
+        assert [result['index'] for result in results] == list(range(len(orders)))
+        assert [result['success'] for result in results] == [True] + [False] * 8 + [True]
+        # 返回的订单数据与订单查询接口格式相同
+        order, items = OrderSerializationService.load(order_id=results[0]['order']['id'])
+        assert results[0]['order'] == OrderSerializationService.to_dict(order, items)
+        assert db.session.query(Product.stock).filter_by(id=product_ids[0]).scalar() == 100000 - 12
+        print("=== 所有测试通过 ===")
+
+
+def test_order_api_validation():
+    """测试下单接口兼容字符串商品ID，格式错误的商品返回 400"""
+    app = create_app('testing')
+    client = app.test_client()
+
+    with app.app_context():
+        product_ids = create_products(1)
+        cases = [
+            ({'customer_name': '批发客户', 'items': [{'product_id': str(product_ids[0]), 'quantity': 1}]}, 201),
+            ({'customer_name': '批发客户', 'items': [{'quantity': 1}]}, 400),
+            ({'customer_name': '批发客户', 'items': [{'product_id': 'abc', 'quantity': 1}]}, 400),
+            ({'customer_name': '批发客户', 'items': ['not-a-dict']}, 400),
+            (['not-an-order'], 400),
+        ]
+        for data, status in cases:
+            response = client.post('/api/orders', json=data)
+            print(f"  {data!r}: {response.status_code} {response.get_json()['success']}")
+            assert response.status_code == status
+        assert db.session.query(Product.stock).filter_by(id=product_ids[0]).scalar() == 100000 - 1
+        print("=== 所有测试通过 ===")
+
+
+if __name__ == '__main__':
+    test_order_benchmark()
+    test_batch_order_benchmark()
+    test_batch_order_validation()
+    test_order_api_validation()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+测试订单号并发生成
+多个进程（模拟 gunicorn worker）、每个进程多个线程同时生成订单号并写入订单表，
+订单号唯一约束不能出现冲突
+"""
+import sys
+import os
+import tempfile
+import threading
+import multiprocessing
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath('.'))
+
+# 使用测试配置和独立的 SQLite 文件数据库，不受 DATABASE_URL 环境变量影响
+TEST_CONFIG = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tempfile.gettempdir(), 'order_no_concurrency.db')}"}
+
+from sqlalchemy import insert, func
+from app import create_app
+from app.models import db, Order
+from app.services.order_service import OrderService
+
+PROCESSES = 4
+THREADS = 4
+ORDERS_PER_THREAD = 2500
+BATCH_SIZE = 500
+
+
+def create_orders(app, count, errors):
+    """生成订单号并批量写入订单（先生成再写入，见 generate_order_no 说明）"""
+    try:
+        with app.app_context():
+            for _ in range(count // BATCH_SIZE):
+                order_nos = [OrderService.generate_order_no() for _ in range(BATCH_SIZE)]
+                db.session.execute(insert(Order), [
+                    {'order_no': order_no, 'customer_name': '并发测试'} for order_no in order_nos
+                ])
+                db.session.commit()
+    except Exception as e:
+        errors.append(e)
+
+
+def run_worker(_):
+    """一个进程内多个线程并发下单，返回出错数量"""
+    app = create_app('testing', TEST_CONFIG)
+    errors = []
+    threads = [
+        threading.Thread(target=create_orders, args=(app, ORDERS_PER_THREAD, errors))
+        for _ in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for error in errors:
+        print(f"进程 {os.getpid()} 出错: {error}")
+    return len(errors)
+
+
+def test_order_no_concurrency():
+    """测试多进程多线程生成订单号不冲突"""
+    app = create_app('testing', TEST_CONFIG)
+    with app.app_context():
+        db.session.query(Order).filter(Order.customer_name == '并发测试').delete()
+        db.session.commit()
+
+    total = PROCESSES * THREADS * ORDERS_PER_THREAD
+    print(f"=== {PROCESSES} 个进程 x {THREADS} 个线程，共创建 {total} 个订单 ===")
+    with multiprocessing.get_context('spawn').Pool(PROCESSES) as pool:
+        error_count = sum(pool.map(run_worker, range(PROCESSES)))
+    assert error_count == 0, f'{error_count} 个线程出错'
+
+    with app.app_context():
+        created = db.session.query(Order).filter(Order.customer_name == '并发测试')
+        count = created.count()
+        distinct = created.with_entities(func.count(func.distinct(Order.order_no))).scalar()
+    print(f"写入订单 {count} 个，不同订单号 {distinct} 个")
+    assert count == total and distinct == total
+    print("=== 所有测试通过 ===")
+
+
+if __name__ == '__main__':
+    test_order_no_concurrency()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+测试订单搜索索引
+生成大量订单后，对比 contains 全表扫描与检索词索引的查询结果和耗时：
+订单号前缀/后缀、电话后几位、客户姓名的结果必须一致，索引查询必须比全表扫描快；
+宽泛查询两者都是取满一页即停止，索引查询只多几次有上限的计数查询
+"""
+import sys
+import os
+import time
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath('.'))
+
+# 使用测试配置和独立的 SQLite 文件数据库，不受 DATABASE_URL 环境变量影响
+TEST_CONFIG = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tempfile.gettempdir(), 'order_search.db')}"}
+
+from sqlalchemy import insert, or_
+from app import create_app
+from app.models import db, Order, OrderSearchTerm
+from app.services.order_search_service import OrderSearchService
+
+ORDER_COUNT = 200000
+# 每个查询重复执行的次数（取最快的一次，排除首次编译语句等偶然开销）
+ROUNDS = 3
+# 宽泛查询的耗时上限（毫秒）
+BROAD_QUERY_MS = 50
+SURNAMES = '张王李赵刘陈杨黄周吴徐孙马朱胡郭何高林罗'
+GIVEN_NAMES = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超兰霞平刚桂'
+
+
+def create_orders():
+    """批量插入测试订单（不经过 OrderService，由 rebuild 生成检索词）"""
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(ORDER_COUNT):
+        created_at = start + timedelta(minutes=i)
+        rows.append({
+            'order_no': f"ORD{created_at.strftime('%Y%m%d')}{i:06d}",
+            'customer_name': rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_NAMES) for _ in range(rng.randint(1, 2))),
+            'customer_phone': f"1{rng.randint(3, 9)}{rng.randint(0, 999999999):09d}",
+            'created_at': created_at,
+            'updated_at': created_at
+        })
+    for offset in range(0, len(rows), 10000):
+        db.session.execute(insert(Order), rows[offset:offset + 10000])
+    db.session.commit()
+
+
+def page_ids(orders_query, per_page=20):
+    """后台订单列表的第一页"""
+    return [order.id for order in orders_query.order_by(Order.created_at.desc(), Order.id.desc()).limit(per_page)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+
+def best_of(func):
+    """执行 ROUNDS 次，返回结果和最快一次的耗时"""
+    runs = [timed(func) for _ in range(ROUNDS)]
+    return runs[0][0], min(ms for _, ms in runs)
+
+
+def test_order_search():
+    """测试订单搜索结果与 contains 查询一致，并输出耗时"""
+    app = create_app('testing', TEST_CONFIG)
+    with app.app_context():
+        if Order.query.count() < ORDER_COUNT:
+            print(f"生成 {ORDER_COUNT} 个测试订单...")
+            create_orders()
+            print(f"生成检索词: {OrderSearchService.rebuild()} 个订单, {OrderSearchTerm.query.count()} 条检索词")
+
+        sample = Order.query.order_by(Order.id.desc()).offset(ORDER_COUNT // 2).first()
+        # (说明, 查询词, 是否宽泛查询)
+        cases = [
+            ('订单号前缀', sample.order_no[:12], False),
+            ('订单号后缀', sample.order_no[-6:], False),
+            ('电话后四位', sample.customer_phone[-4:], False),
+            ('客户姓名', sample.customer_name, False),
+            # 命中大量订单的查询（按时间倒序扫描）
+            ('单个姓氏', sample.customer_name[0], False),
+            ('宽泛查询', 'ORD', True),
+        ]
+
+        # id 小于已索引订单的订单缺少检索词（如升级前的订单），catch_up 也要补齐
+        OrderSearchTerm.query.filter_by(order_id=sample.id).delete()
+        db.session.commit()
+        OrderSearchService._checked_through = (None, 0)
+        count, full_ms = timed(OrderSearchService.catch_up)
+        assert count == 1, '未补齐缺少检索词的订单'
+        count, incremental_ms = timed(OrderSearchService.catch_up)
+        assert count == 0
+        print(f"补齐检索词: 全量检查 {full_ms:.1f} ms, 之后增量检查 {incremental_ms:.1f} ms")
+
+        print(f"=== {Order.query.count()} 个订单 ===")
+        for label, query, broad in cases:
+            # 与索引语义相同的 LIKE 查询（全表扫描）
+            expected_filter = or_(
+                Order.order_no.startswith(query),
+                Order.order_no.endswith(query),
+                Order.customer_phone.endswith(query),
+                Order.customer_name.contains(query)
+            )
+            expected, scan_ms = best_of(lambda: page_ids(Order.query.filter(expected_filter)))
+            actual, index_ms = best_of(lambda: page_ids(OrderSearchService.filter_orders(Order.query, query)))
+            print(f"{label} {query!r}: 全表扫描 {scan_ms:.1f} ms, 索引 {index_ms:.1f} ms, 命中 {len(actual)} 个")
+            assert actual == expected, f'{label} 搜索结果不一致'
+            if broad:
+                assert index_ms < BROAD_QUERY_MS, f'{label} 耗时 {index_ms:.1f} ms'
+            else:
+                assert index_ms < scan_ms, f'{label} 索引查询比全表扫描慢'
+            # 全部命中结果也一致
+            all_expected = {order.id for order in Order.query.filter(expected_filter)}
+            all_actual = {order.id for order in OrderSearchService.filter_orders(Order.query, query)}
+            assert sample.id in all_actual and all_actual == all_expected, f'{label} 搜索结果不一致'
+        print("=== 所有测试通过 ===")
+
+
+if __name__ == '__main__':
+    test_order_search()
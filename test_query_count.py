@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+"""
+测试产品列表的查询次数
+搜索/列表接口每页的 SQL 查询数必须是常数，不能随产品数量增长（图片 N+1 问题）
+"""
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath('.'))
+
+from sqlalchemy import event
+from app import create_app
+from app.models import db, Product, ProductImage
+from app.routes.api import search_result_cache
+from app.services.serialization_service import SerializationService
+
+
+class QueryCounter:
+    """统计代码块内执行的 SQL 语句数量"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def create_products(count):
+    """创建带图片的测试产品"""
+    for i in range(count):
+        product = Product(product_code=f'QC{i:04d}', name=f'查询计数产品{i}', retail_price=1, wholesale_price=1)
+        db.session.add(product)
+        db.session.flush()
+        for idx in range(3):
+            db.session.add(ProductImage(
+                product_id=product.id,
+                image_url=f'/static/uploads/products/qc_{i}_{idx}.jpg',
+                is_primary=(idx == 1),
+                sort_order=idx
+            ))
+    db.session.commit()
+
+
+def count_queries(client, url):
+    """请求指定地址并返回执行的查询次数（不走搜索结果缓存和产品片段缓存）"""
+    search_result_cache.clear()
+    SerializationService.clear()
+    with QueryCounter(db.engine) as counter:
+        response = client.get(url)
+    assert response.status_code == 200, f'{url} 返回 {response.status_code}'
+    return counter.count
+
+
+def test_query_count():
+    """测试每页查询次数与当页产品数量无关"""
+    app = create_app('testing')
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        create_products(30)
+        client = app.test_client()
+        client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+
+        urls = [
+            '/api/products/search?q={q}',
+            '/search?q={q}&format=json',
+            '/admin/products?q={q}',
+        ]
+
+        print("=== 测试列表查询次数 ===")
+        for url in urls:
+            # 预热（搜索索引、系统设置等）
+            count_queries(client, url.format(q='QC0001'))
+            # 只命中1个产品 vs 命中整页20个产品
+            small = count_queries(client, url.format(q='QC0001'))
+            large = count_queries(client, url.format(q='查询计数'))
+            print(f"{url.format(q='...')}: 1个产品 {small} 次查询, 20个产品 {large} 次查询")
+            assert small == large, f'{url.format(q="...")} 查询次数随每页数量增长: {small} -> {large}'
+
+        print("=== 所有测试通过 ===")
+
+
+if __name__ == '__main__':
+    test_query_count()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+"""
+测试并发下单扣减库存，以及取消订单归还库存
+多个进程（模拟 gunicorn worker）、每个进程多个线程同时抢购同一批商品，
+成功的订单数量之和必须等于初始库存，库存不能扣成负数，
+其余请求应得到库存不足的错误而不是数据库锁错误
+"""
+import sys
+import os
+import time
+import tempfile
+import threading
+import multiprocessing
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath('.'))
+
+# 使用测试配置和独立的 SQLite 文件数据库，不受 DATABASE_URL 环境变量影响
+TEST_CONFIG = {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tempfile.gettempdir(), 'stock_concurrency.db')}"}
+
+from sqlalchemy import func, event
+from app import create_app
+from app.models import db, Order, OrderItem, OrderSearchTerm, NotificationOutbox, Product
+from app.services.order_service import OrderService, InsufficientStockError
+
+PROCESSES = 4
+THREADS = 4
+ORDERS_PER_THREAD = 40
+# 热门商品库存，小于总下单数量，一部分订单会因库存不足失败
+HOT_STOCK = 400
+# 普通商品库存，足够所有订单
+COMMON_STOCK = 100000
+CUSTOMER_NAME = '库存并发测试'
+TEST_PRODUCT_CODES = ['STOCK-HOT', 'STOCK-COMMON', 'STOCK-CANCEL']
+
+
+def delete_test_data():
+    """删除上次运行留下的测试订单和商品"""
+    order_ids = db.session.query(Order.id).filter(Order.customer_name == CUSTOMER_NAME)
+    for model in (OrderItem, OrderSearchTerm, NotificationOutbox):
+        db.session.query(model).filter(model.order_id.in_(order_ids)).delete(synchronize_session=False)
+    db.session.query(Order).filter(Order.customer_name == CUSTOMER_NAME).delete()
+    db.session.query(Product).filter(Product.product_code.in_(TEST_PRODUCT_CODES)).delete()
+
+
+def place_orders(app, product_ids, results, lock):
+    """连续下单，统计成功、库存不足和其他错误的次数"""
+    hot_id, common_id = product_ids
+    with app.app_context():
+        for _ in range(ORDERS_PER_THREAD):
+            try:
+                OrderService.create_order({
+                    'customer_name': CUSTOMER_NAME,
+                    'items': [
+                        {'product_id': common_id, 'quantity': 2},
+                        {'product_id': hot_id, 'quantity': 1}
+                    ]
+                })
+                outcome = 'created'
+            except InsufficientStockError:
+                outcome = 'rejected'
+            except Exception as e:
+                db.session.rollback()
+                outcome = str(e)
+            with lock:
+                if outcome in ('created', 'rejected'):
+                    results[outcome] += 1
+                else:
+                    results['errors'].append(outcome)
+
+
+def run_worker(product_ids):
+    """一个进程内多个线程并发下单，返回统计结果"""
+    app = create_app('testing', TEST_CONFIG)
+    results = {'created': 0, 'rejected': 0, 'errors': []}
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=place_orders, args=(app, product_ids, results, lock))
+        for _ in range(THREADS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_stock_concurrency():
+    """测试并发下单不超卖"""
+    app = create_app('testing', TEST_CONFIG)
+    with app.app_context():
+        delete_test_data()
+        hot = Product(product_code='STOCK-HOT', name='抢购商品', retail_price=10, wholesale_price=8,
+                      wholesale_min_qty=5, stock=HOT_STOCK)
+        common = Product(product_code='STOCK-COMMON', name='普通商品', retail_price=10, wholesale_price=8,
+                         wholesale_min_qty=5, stock=COMMON_STOCK)
+        db.session.add_all([hot, common])
+        db.session.commit()
+        product_ids = (hot.id, common.id)
+
+    total = PROCESSES * THREADS * ORDERS_PER_THREAD
+    print(f"=== {PROCESSES} 个进程 x {THREADS} 个线程，共 {total} 次下单，抢购商品库存 {HOT_STOCK} ===")
+    start = time.perf_counter()
+    with multiprocessing.get_context('spawn').Pool(PROCESSES) as pool:
+        results = pool.map(run_worker, [product_ids] * PROCESSES)
+    elapsed = time.perf_counter() - start
+
+    created = sum(result['created'] for result in results)
+    rejected = sum(result['rejected'] for result in results)
+    errors = [error for result in results for error in result['errors']]
+    print(f"成功 {created} 单，库存不足 {rejected} 单，其他错误 {len(errors)} 次，耗时 {elapsed:.2f} 秒")
+    for error in errors[:5]:
+        print(f"  错误: {error}")
+    assert not errors, '并发下单出现数据库错误'
+    assert created == HOT_STOCK and rejected == total - HOT_STOCK
+
+    with app.app_context():
+        hot, common = db.session.get(Product, product_ids[0]), db.session.get(Product, product_ids[1])
+        sold = db.session.query(func.sum(OrderItem.quantity)).filter(
+            OrderItem.product_id == hot.id
+        ).scalar() or 0
+        print(f"抢购商品剩余库存 {hot.stock}，售出 {sold}；普通商品剩余库存 {common.stock}")
+        assert hot.stock == 0 and sold == HOT_STOCK
+        assert common.stock == COMMON_STOCK - 2 * created
+    print("=== 所有测试通过 ===")
+
+
+def test_cancel_releases_stock():
+    """测试取消订单（单个、批量）归还库存，恢复已取消的订单重新扣减"""
+    app = create_app('testing', TEST_CONFIG)
+    with app.app_context():
+        delete_test_data()
+        product = Product(product_code='STOCK-CANCEL', name='取消测试商品', retail_price=10, wholesale_price=8,
+                          wholesale_min_qty=5, stock=10)
+        db.session.add(product)
+        db.session.commit()
+
+        def stock():
+            return db.session.query(Product.stock).filter_by(id=product.id).scalar()
+
+        orders = [
+            OrderService.create_order({
+                'customer_name': CUSTOMER_NAME,
+                'items': [{'product_id': product.id, 'quantity': 3}]
+            })
+            for _ in range(3)
+        ]
+        assert stock() == 1
+
+        # 单个取消归还库存，重复取消不会重复归还
+        OrderService.update_order_status(orders[0].id, 'cancelled')
+        assert stock() == 4
+        OrderService.update_order_status(orders[0].id, 'cancelled')
+        assert stock() == 4
+
+        # 批量取消只归还实际被取消的订单，已发货的订单不能取消
+        OrderService.bulk_update_status([orders[1].id], 'confirmed')
+        OrderService.bulk_update_status([orders[2].id], 'confirmed')
+        OrderService.bulk_update_status([orders[2].id], 'shipped')
+        updated = OrderService.bulk_update_status([order.id for order in orders], 'cancelled')
+        assert updated == 1 and stock() == 7
+
+        # 已取消的订单恢复后重新扣减，库存不足时状态不变
+        OrderService.update_order_status(orders[0].id, 'pending')
+        assert stock() == 4
+        db.session.query(Product).filter_by(id=product.id).update({Product.stock: 2})
+        db.session.commit()
+        try:
+            OrderService.update_order_status(orders[1].id, 'pending')
+            raise AssertionError('库存不足时应拒绝恢复订单')
+        except InsufficientStockError:
+            pass
+        assert db.session.get(Order, orders[1].id).status == 'cancelled' and stock() == 2
+        print(f"取消/恢复订单后库存正确：剩余 {stock()}")
+
+
+def test_stock_version_outside_order_transaction():
+    """测试下单事务中不写版本行：库存版本号在订单提交之后用独立事务递增"""
+    app = create_app('testing', TEST_CONFIG)
+    with app.app_context():
+        delete_test_data()
+        product = Product(product_code='STOCK-CANCEL', name='取消测试商品', retail_price=10, wholesale_price=8,
+                          wholesale_min_qty=5, stock=10)
+        db.session.add(product)
+        db.session.commit()
+
+        events = []
+        on_execute = lambda conn, cursor, statement, *args: events.append(' '.join(statement.split()[:3]))
+        on_commit = lambda conn: events.append('COMMIT')
+        event.listen(db.engine, 'before_cursor_execute', on_execute)
+        event.listen(db.engine, 'commit', on_commit)
+        try:
+            order = OrderService.create_order({
+                'customer_name': CUSTOMER_NAME,
+                'items': [{'product_id': product.id, 'quantity': 1}]
+            })
+            OrderService.update_order_status(order.id, 'cancelled')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', on_execute)
+            event.remove(db.engine, 'commit', on_commit)
+
+        # 每次改库存的事务提交之后才更新 catalog_versions
+        version_updates = [i for i, statement in enumerate(events) if statement == 'UPDATE catalog_versions SET']
+        stock_updates = [i for i, statement in enumerate(events) if statement == 'UPDATE products SET']
+        assert len(version_updates) == len(stock_updates) == 2, events
+        for stock_update, version_update in zip(stock_updates, version_updates):
+            assert 'COMMIT' in events[stock_update:version_update], events
+        print("库存版本号在订单事务提交后递增")
+
+
+if __name__ == '__main__':
+    test_stock_concurrency()
+    test_cancel_releases_stock()
+    test_stock_version_outside_order_transaction()